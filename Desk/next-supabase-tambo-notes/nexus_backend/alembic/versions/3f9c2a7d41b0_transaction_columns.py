@@ -0,0 +1,69 @@
+"""Transaction id default and VARCHAR type/status columns
+
+Tables created before these changes have no DEFAULT on transactions.id (the
+application no longer sets ids itself), and store transaction_type and status
+as native enums holding the member names ("SUCCESS"). The model now expects
+VARCHAR(16) columns holding the lowercase values, restricted by CHECKs.
+
+Revision ID: 3f9c2a7d41b0
+Revises:
+Create Date: 2026-10-15 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9c2a7d41b0"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TRANSACTION_TYPES = ("command", "query", "notification", "system")
+TRANSACTION_STATUSES = ("pending", "processing", "success", "failed", "rolled_back")
+
+# IF EXISTS throughout: on a fresh database init_db() creates the table from the models
+
+def _in_values(column: str, values: Sequence[str]) -> str:
+    return f"{column} IN ({', '.join(repr(value) for value in values)})"
+
+
+def upgrade() -> None:
+    # gen_random_uuid() is built in from Postgres 13
+    op.execute("ALTER TABLE IF EXISTS transactions ALTER COLUMN id SET DEFAULT gen_random_uuid()")
+
+    # Enum names become the lowercase values the application compares against;
+    # already-VARCHAR columns pass through unchanged
+    op.execute(
+        "ALTER TABLE IF EXISTS transactions "
+        "ALTER COLUMN transaction_type TYPE varchar(16) USING lower(transaction_type::text), "
+        "ALTER COLUMN status TYPE varchar(16) USING lower(status::text)"
+    )
+    op.execute("DROP TYPE IF EXISTS transactiontype")
+    op.execute("DROP TYPE IF EXISTS transactionstatus")
+    op.execute(
+        "ALTER TABLE IF EXISTS transactions "
+        "DROP CONSTRAINT IF EXISTS ck_transactions_type, "
+        "DROP CONSTRAINT IF EXISTS ck_transactions_status, "
+        f"ADD CONSTRAINT ck_transactions_type CHECK ({_in_values('transaction_type', TRANSACTION_TYPES)}), "
+        f"ADD CONSTRAINT ck_transactions_status CHECK ({_in_values('status', TRANSACTION_STATUSES)})"
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "ALTER TABLE IF EXISTS transactions "
+        "DROP CONSTRAINT IF EXISTS ck_transactions_type, "
+        "DROP CONSTRAINT IF EXISTS ck_transactions_status"
+    )
+    op.execute(f"CREATE TYPE transactiontype AS ENUM ({', '.join(repr(v.upper()) for v in TRANSACTION_TYPES)})")
+    op.execute(f"CREATE TYPE transactionstatus AS ENUM ({', '.join(repr(v.upper()) for v in TRANSACTION_STATUSES)})")
+    op.execute(
+        "ALTER TABLE IF EXISTS transactions "
+        "ALTER COLUMN transaction_type TYPE transactiontype USING upper(transaction_type)::transactiontype, "
+        "ALTER COLUMN status TYPE transactionstatus USING upper(status)::transactionstatus"
+    )
+    op.execute("ALTER TABLE IF EXISTS transactions ALTER COLUMN id DROP DEFAULT")
@@ -0,0 +1,60 @@
+"""Composite time-window indexes on transactions
+
+The model replaces the single-column status and created_by indexes with
+composite ones serving the per-user spending and history queries.
+create_all() doesn't add indexes to an existing table, so they are built
+here (concurrently, so writes aren't blocked while they build).
+
+Revision ID: 8d1e4b6c2f95
+Revises: 3f9c2a7d41b0
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8d1e4b6c2f95"
+down_revision: Union[str, None] = "3f9c2a7d41b0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+NEW_INDEXES = {
+    "ix_tx_user_time": "(created_by, created_at)",
+    "ix_tx_user_status_time": "(created_by, status, created_at) INCLUDE (cost)",
+    "ix_tx_status_time": "(status, created_at)",
+}
+OLD_INDEXES = {
+    "ix_transactions_status": "(status)",
+    "ix_transactions_created_by": "(created_by)",
+}
+
+
+def _has_transactions() -> bool:
+    # On a fresh database init_db() creates the table, indexes included
+    if context.is_offline_mode():
+        return True
+    return sa.inspect(op.get_bind()).has_table("transactions")
+
+
+def _swap_indexes(create: dict, drop: dict) -> None:
+    if not _has_transactions():
+        return
+    # CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, columns in create.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON transactions {columns}")
+        for name in drop:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def upgrade() -> None:
+    _swap_indexes(NEW_INDEXES, OLD_INDEXES)
+
+
+def downgrade() -> None:
+    _swap_indexes(OLD_INDEXES, NEW_INDEXES)
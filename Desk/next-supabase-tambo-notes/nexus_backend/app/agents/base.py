@@ -4,13 +4,20 @@ Base Agent class and AgentResult dataclass
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from typing import Dict, Any, Optional, List
-from datetime import datetime
+import time
 import structlog
 
 logger = structlog.get_logger()
 
+# Returned by the default estimate_cost_and_risk(); treat as read-only
+DEFAULT_ESTIMATION: Dict[str, Any] = {
+    "cost": 0.0,
+    "risk_level": "low",
+    "requires_approval": False,
+}
 
-@dataclass
+
+@dataclass(slots=True)
 class AgentResult:
     """Result from agent execution"""
     success: bool
@@ -24,6 +31,23 @@ class AgentResult:
     risk_level: Optional[str] = None
 
 
+# Shared empty containers for error results; never mutated
+_EMPTY_DICT: Dict[str, Any] = {}
+_EMPTY_LIST: List[Dict[str, Any]] = []
+
+
+def error_result(error: str, execution_time_ms: Optional[float] = None) -> AgentResult:
+    """Build a failed AgentResult without allocating empty data/metadata/sources"""
+    return AgentResult(
+        success=False,
+        error=error,
+        execution_time_ms=execution_time_ms,
+        data=_EMPTY_DICT,
+        metadata=_EMPTY_DICT,
+        sources=_EMPTY_LIST,
+    )
+
+
 class BaseAgent(ABC):
     """Base class for all agents"""
     
@@ -32,6 +56,8 @@ class BaseAgent(ABC):
         self.name = name
         self.description = description
         self.metadata: Dict[str, Any] = {}
+        # Static agent context is bound once instead of on every log call
+        self._log = logger.bind(agent_id=agent_id, agent_name=name)
     
     @abstractmethod
     async def execute(self, task: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> AgentResult:
@@ -55,26 +81,27 @@ class BaseAgent(ABC):
         - Logging
         - Execution time tracking
         """
-        start_time = datetime.utcnow()
+        start_time = time.perf_counter()
+        agent_class = type(self)
         
         try:
-            # Validation
+            # Validation (the default check is inlined to skip a coroutine round-trip)
             if validate:
-                validation_error = await self.validate_input(task, context)
+                if agent_class.validate_input is BaseAgent.validate_input:
+                    validation_error = None if task else "Task is required"
+                else:
+                    validation_error = await self.validate_input(task, context)
                 if validation_error:
-                    return AgentResult(
-                        success=False,
-                        error=f"Validation failed: {validation_error}",
-                        execution_time_ms=0.0,
-                    )
+                    return error_result(f"Validation failed: {validation_error}", 0.0)
             
-            # Estimation
-            estimation = await self.estimate_cost_and_risk(task, context)
+            # Estimation (only awaited when a subclass overrides it)
+            if agent_class.estimate_cost_and_risk is BaseAgent.estimate_cost_and_risk:
+                estimation = DEFAULT_ESTIMATION
+            else:
+                estimation = await self.estimate_cost_and_risk(task, context)
             
-            logger.info(
+            self._log.info(
                 "Agent execution started",
-                agent_id=self.agent_id,
-                agent_name=self.name,
                 task_id=task.get("id"),
                 estimated_cost=estimation.get("cost"),
                 risk_level=estimation.get("risk_level"),
@@ -84,8 +111,7 @@ class BaseAgent(ABC):
             result = await self.execute(task, context)
             
             # Calculate execution time
-            end_time = datetime.utcnow()
-            execution_time_ms = (end_time - start_time).total_seconds() * 1000
+            execution_time_ms = (time.perf_counter() - start_time) * 1000.0
             result.execution_time_ms = execution_time_ms
             
             # Add estimation to result
@@ -93,9 +119,8 @@ class BaseAgent(ABC):
             result.risk_level = estimation.get("risk_level")
             result.requires_approval = estimation.get("requires_approval", False)
             
-            logger.info(
+            self._log.info(
                 "Agent execution completed",
-                agent_id=self.agent_id,
                 success=result.success,
                 execution_time_ms=execution_time_ms,
             )
@@ -103,22 +128,16 @@ class BaseAgent(ABC):
             return result
             
         except Exception as e:
-            end_time = datetime.utcnow()
-            execution_time_ms = (end_time - start_time).total_seconds() * 1000
+            execution_time_ms = (time.perf_counter() - start_time) * 1000.0
             
-            logger.error(
+            self._log.error(
                 "Agent execution failed",
-                agent_id=self.agent_id,
                 error=str(e),
                 execution_time_ms=execution_time_ms,
                 exc_info=True,
             )
             
-            return AgentResult(
-                success=False,
-                error=f"Agent execution failed: {str(e)}",
-                execution_time_ms=execution_time_ms,
-            )
+            return error_result(f"Agent execution failed: {str(e)}", execution_time_ms)
     
     async def validate_input(self, task: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> Optional[str]:
         """
@@ -140,11 +159,7 @@ class BaseAgent(ABC):
         Override in subclasses for specific estimation.
         Returns dict with 'cost', 'risk_level', 'requires_approval'.
         """
-        return {
-            "cost": 0.0,
-            "risk_level": "low",
-            "requires_approval": False,
-        }
+        return dict(DEFAULT_ESTIMATION)
     
     def get_metadata(self) -> Dict[str, Any]:
         """Get agent metadata"""
@@ -1,19 +1,99 @@
 """
 Communication Agent - Email drafting and sending via Resend
 """
-from typing import Dict, Any, Optional
-from app.agents.base import BaseAgent, AgentResult
+from typing import Dict, Any, Optional, List
+from app.agents.base import BaseAgent, AgentResult, error_result
 from app.agents.registry import registry
 from app.config import settings
+from app.utils.http_client import get_http_client, is_retryable, retry_delay
+from app.utils.llm import cached_groq_json
+from app.utils.batcher import AsyncBatcher
+from uuid import uuid4
+import asyncio
+import hashlib
 import httpx
-import structlog
 import re
 from datetime import datetime, timedelta
 
-logger = structlog.get_logger()
-
 RESEND_API_KEY = getattr(settings, "RESEND_API_KEY", None)
 RATE_LIMIT_EMAILS_PER_HOUR = 10
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\Z')
+RESEND_EMAILS_URL = "https://api.resend.com/emails"
+RESEND_BATCH_URL = "https://api.resend.com/emails/batch"
+RESEND_MAX_BATCH_SIZE = 100  # Resend's per-request batch limit
+RESEND_SEND_ATTEMPTS = 2
+
+
+class ResendBatcher(AsyncBatcher):
+    """
+    Groups concurrent sends into a single Resend batch request.
+    Items are {"idempotency_key": ..., "email": {...}}; each caller gets back
+    Resend's result for its own email, or its own error.
+    """
+    
+    def __init__(self, api_key: str, max_batch_size: int = RESEND_MAX_BATCH_SIZE, max_queue_time: float = 0.1):
+        super().__init__(max_batch_size=max_batch_size, max_queue_time=max_queue_time)
+        self.api_key = api_key
+    
+    async def process_batch(self, items: List[Dict[str, Any]]) -> List[Any]:
+        """Post queued emails to Resend's batch endpoint; results are returned in order"""
+        # Same emails, same key: a retried batch is answered from Resend's record
+        # of the first attempt instead of being sent again
+        batch_key = hashlib.sha256("\n".join(item["idempotency_key"] for item in items).encode()).hexdigest()
+        try:
+            response = await self._post(
+                RESEND_BATCH_URL,
+                [item["email"] for item in items],
+                batch_key,
+                # Invalid emails are reported per index instead of failing the batch
+                extra_headers={"x-batch-validation": "permissive"},
+            )
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500 or e.response.status_code == 429:
+                raise
+            # The batch was rejected outright, so nothing went out: send the emails
+            # one by one so only the offending one fails
+            return await asyncio.gather(*(self._send_one(item) for item in items), return_exceptions=True)
+        
+        body = response.json()
+        errors = {error.get("index"): error.get("message") for error in body.get("errors") or []}
+        sent = iter(body.get("data") or [])  # Results for the accepted emails, in order
+        results: List[Any] = []
+        for index in range(len(items)):
+            if index in errors:
+                results.append(ValueError(errors[index] or "Rejected by Resend"))
+            else:
+                results.append(next(sent, None) or ValueError("Resend returned no result for this email"))
+        return results
+    
+    async def _send_one(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a single queued email"""
+        response = await self._post(RESEND_EMAILS_URL, item["email"], item["idempotency_key"])
+        return response.json()
+    
+    async def _post(
+        self,
+        url: str,
+        payload: Any,
+        idempotency_key: str,
+        extra_headers: Optional[Dict[str, str]] = None,
+    ) -> httpx.Response:
+        """POST to Resend, retrying network errors, 429 and 5xx with the same idempotency key"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Idempotency-Key": idempotency_key,
+            **(extra_headers or {}),
+        }
+        for attempt in range(1, RESEND_SEND_ATTEMPTS + 1):
+            try:
+                response = await get_http_client().post(url, headers=headers, json=payload, timeout=10.0)
+                response.raise_for_status()
+                return response
+            except httpx.HTTPError as e:
+                if attempt == RESEND_SEND_ATTEMPTS or not is_retryable(e):
+                    raise
+                await asyncio.sleep(retry_delay(attempt, e))
 
 
 @registry.register("communication", "Communication Agent", "Drafts and sends emails via Resend")
@@ -22,7 +102,8 @@ class CommunicationAgent(BaseAgent):
     
     def __init__(self, agent_id: str, name: str = "Communication Agent", description: str = ""):
         super().__init__(agent_id, name, description or "Drafts and sends emails via Resend")
-        self.resend_api_key = RESEND_API_KEY or (settings.RESEND_API_KEY if hasattr(settings, "RESEND_API_KEY") else None)
+        self.resend_api_key = RESEND_API_KEY
+        self._resend_batcher = ResendBatcher(self.resend_api_key) if self.resend_api_key else None
     
     async def execute(self, task: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> AgentResult:
         """Execute communication task"""
@@ -33,10 +114,7 @@ class CommunicationAgent(BaseAgent):
         elif action == "send":
             return await self._send_email(task, context)
         else:
-            return AgentResult(
-                success=False,
-                error=f"Unknown action: {action}. Use 'draft' or 'send'",
-            )
+            return error_result(f"Unknown action: {action}. Use 'draft' or 'send'")
     
     async def _draft_email(self, task: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> AgentResult:
         """Draft an email using Groq"""
@@ -45,16 +123,10 @@ class CommunicationAgent(BaseAgent):
         message = task.get("message", "")
         
         if not to_email:
-            return AgentResult(
-                success=False,
-                error="Recipient email (to) is required",
-            )
+            return error_result("Recipient email (to) is required")
         
         if not self._validate_email(to_email):
-            return AgentResult(
-                success=False,
-                error=f"Invalid email format: {to_email}",
-            )
+            return error_result(f"Invalid email format: {to_email}")
         
         try:
             # Use Groq to draft email
@@ -74,11 +146,8 @@ class CommunicationAgent(BaseAgent):
             )
             
         except Exception as e:
-            logger.error("Email drafting failed", error=str(e), exc_info=True)
-            return AgentResult(
-                success=False,
-                error=f"Email drafting failed: {str(e)}",
-            )
+            self._log.error("Email drafting failed", error=str(e), exc_info=True)
+            return error_result(f"Email drafting failed: {str(e)}")
     
     async def _send_email(self, task: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> AgentResult:
         """Send an email via Resend (requires approval)"""
@@ -87,32 +156,20 @@ class CommunicationAgent(BaseAgent):
         if user_id:
             rate_limit_ok = await self._check_rate_limit(user_id)
             if not rate_limit_ok:
-                return AgentResult(
-                    success=False,
-                    error=f"Rate limit exceeded. Maximum {RATE_LIMIT_EMAILS_PER_HOUR} emails per hour.",
-                )
+                return error_result(f"Rate limit exceeded. Maximum {RATE_LIMIT_EMAILS_PER_HOUR} emails per hour.")
         
         to_email = task.get("to")
         subject = task.get("subject", "")
         body = task.get("body", "")
         
         if not to_email:
-            return AgentResult(
-                success=False,
-                error="Recipient email (to) is required",
-            )
+            return error_result("Recipient email (to) is required")
         
         if not self._validate_email(to_email):
-            return AgentResult(
-                success=False,
-                error=f"Invalid email format: {to_email}",
-            )
+            return error_result(f"Invalid email format: {to_email}")
         
         if not self.resend_api_key:
-            return AgentResult(
-                success=False,
-                error="Resend API key not configured",
-            )
+            return error_result("Resend API key not configured")
         
         try:
             # Send via Resend
@@ -136,11 +193,8 @@ class CommunicationAgent(BaseAgent):
             )
             
         except Exception as e:
-            logger.error("Email sending failed", error=str(e), exc_info=True)
-            return AgentResult(
-                success=False,
-                error=f"Email sending failed: {str(e)}",
-            )
+            self._log.error("Email sending failed", error=str(e), exc_info=True)
+            return error_result(f"Email sending failed: {str(e)}")
     
     async def _generate_email_draft(
         self,
@@ -166,37 +220,23 @@ Message/Context: {message}
 Return JSON with keys: subject, body (formatted email body)"""
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {groq_api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": "llama-3.1-70b-versatile",
-                        "messages": [
-                            {"role": "system", "content": "You are an email drafting assistant. Return JSON only."},
-                            {"role": "user", "content": prompt},
-                        ],
-                        "temperature": 0.7,
-                        "response_format": {"type": "json_object"},
-                    },
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                import json
-                content = data["choices"][0]["message"]["content"]
-                draft = json.loads(content)
-                
-                return {
-                    "subject": draft.get("subject", subject),
-                    "body": draft.get("body", message),
-                }
-                
+            # Streamed, and shared with any identical in-flight or recent prompt
+            draft = await cached_groq_json(
+                groq_api_key,
+                [
+                    {"role": "system", "content": "You are an email drafting assistant. Return JSON only."},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.7,
+            )
+            
+            return {
+                "subject": draft.get("subject", subject),
+                "body": draft.get("body", message),
+            }
+            
         except Exception as e:
-            logger.warning("Groq email drafting failed, using fallback", error=str(e))
+            self._log.warning("Groq email drafting failed, using fallback", error=str(e))
             return {
                 "subject": subject or "Email",
                 "body": message or f"Dear recipient,\n\n{message}\n\nBest regards",
@@ -204,30 +244,23 @@ Return JSON with keys: subject, body (formatted email body)"""
     
     async def _send_via_resend(self, to_email: str, subject: str, body: str, from_email: Optional[str] = None) -> Dict[str, Any]:
         """Send email via Resend API"""
-        if not self.resend_api_key:
+        if not self.resend_api_key or self._resend_batcher is None:
             raise ValueError("Resend API key not configured")
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                "https://api.resend.com/emails",
-                headers={
-                    "Authorization": f"Bearer {self.resend_api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "from": from_email or "onboarding@resend.dev",  # Default Resend domain
-                    "to": to_email,
-                    "subject": subject,
-                    "html": body.replace("\n", "<br>"),  # Simple HTML conversion
-                },
-            )
-            response.raise_for_status()
-            return response.json()
+        # Concurrent sends are coalesced into one batch request
+        return await self._resend_batcher.process({
+            "idempotency_key": str(uuid4()),  # Fixed for this send, across retries
+            "email": {
+                "from": from_email or "onboarding@resend.dev",  # Default Resend domain
+                "to": to_email,
+                "subject": subject,
+                "text": body,  # Plain text; Resend keeps the line breaks
+            },
+        })
     
     def _validate_email(self, email: str) -> bool:
         """Validate email format"""
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return bool(re.match(pattern, email))
+        return EMAIL_PATTERN.match(email) is not None
     
     async def _check_rate_limit(self, user_id: str) -> bool:
         """Check if user has exceeded rate limit using Redis"""
@@ -1,18 +1,61 @@
 """
 Purchase Agent - Product research and recommendations (no purchasing)
 """
-from typing import Dict, Any, Optional, List
-from app.agents.base import BaseAgent, AgentResult
+from typing import Dict, Any, Optional, List, Tuple
+from app.agents.base import BaseAgent, AgentResult, error_result
 from app.agents.registry import registry
+from app.agents.research_agent import ResearchAgent  # Ensures "research" is registered
 from app.config import settings
-import httpx
-import structlog
-import json
-
-logger = structlog.get_logger()
+from app.utils.http_client import get_http_client
+from app.utils import jsonlib
+from app.utils.llm import cached_groq_json
+from app.utils.cache import TTLCache
+from functools import lru_cache
+import asyncio
+import re
 
 BRAVE_API_KEY = getattr(settings, "BRAVE_API_KEY", None)
 COINGECKO_API_URL = "https://api.coingecko.com/api/v3"
+PRICE_CACHE_TTL_SECONDS = 30
+
+# coin_id -> price data; CoinGecko only refreshes every few seconds and rate-limits hard
+_price_cache = TTLCache(ttl=PRICE_CACHE_TTL_SECONDS, maxsize=256)
+_price_locks: Dict[str, asyncio.Lock] = {}
+
+# Keyword -> CoinGecko coin ID (simplified mapping)
+COIN_IDS = {
+    "bitcoin": "bitcoin",
+    "btc": "bitcoin",
+    "ethereum": "ethereum",
+    "eth": "ethereum",
+    "solana": "solana",
+    "sol": "solana",
+    "cardano": "cardano",
+    "ada": "cardano",
+}
+DEFAULT_COIN_ID = "bitcoin"
+CRYPTO_KEYWORDS = frozenset({"crypto", "cryptocurrency", "coin", "token", *COIN_IDS})
+# One alternation scans the query once instead of a substring search per keyword.
+# Longest keywords first so "cryptocurrency" wins over "crypto".
+CRYPTO_PATTERN = re.compile(
+    r"\b(" + "|".join(map(re.escape, sorted(CRYPTO_KEYWORDS, key=len, reverse=True))) + r")s?\b",
+    re.IGNORECASE,
+)
+
+
+@lru_cache(maxsize=1024)
+def classify_query(query: str) -> Tuple[bool, Optional[str]]:
+    """
+    Classify a query in a single regex pass.
+    Returns (is_crypto, coin_id); coin_id is None if no specific coin is named.
+    """
+    is_crypto = False
+    for match in CRYPTO_PATTERN.finditer(query):
+        is_crypto = True
+        coin_id = COIN_IDS.get(match.group(1).lower())
+        if coin_id:
+            return True, coin_id
+    return is_crypto, None
 
 
 @registry.register("purchase", "Purchase Agent", "Researches products and provides recommendations (no purchasing)")
@@ -21,24 +64,21 @@ class PurchaseAgent(BaseAgent):
     
     def __init__(self, agent_id: str, name: str = "Purchase Agent", description: str = ""):
         super().__init__(agent_id, name, description or "Researches products and provides recommendations")
-        self.brave_api_key = BRAVE_API_KEY or (settings.BRAVE_API_KEY if hasattr(settings, "BRAVE_API_KEY") else None)
+        self.brave_api_key = BRAVE_API_KEY
     
     async def execute(self, task: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> AgentResult:
         """Execute purchase research task"""
         query = task.get("query") or task.get("product") or task.get("message", "")
         if not query:
-            return AgentResult(
-                success=False,
-                error="Product query is required",
-            )
+            return error_result("Product query is required")
         
         try:
             # Check if it's a crypto query
-            is_crypto = await self._is_crypto_query(query)
+            is_crypto, coin_id = classify_query(query)
             
             if is_crypto:
                 # Get crypto price
-                crypto_data = await self._get_crypto_price(query)
+                crypto_data = await self._get_crypto_price(coin_id or DEFAULT_COIN_ID)
                 return AgentResult(
                     success=True,
                     data={
@@ -52,8 +92,11 @@ class PurchaseAgent(BaseAgent):
             
             # Regular product research
             products = await self._research_products(query)
-            comparison = await self._compare_products(query, products)
-            budget_analysis = await self._analyze_budget(products)
+            # Budget analysis doesn't depend on the LLM comparison, so run both together
+            comparison, budget_analysis = await asyncio.gather(
+                self._compare_products(query, products),
+                self._analyze_budget(products),
+            )
             
             return AgentResult(
                 success=True,
@@ -70,77 +113,58 @@ class PurchaseAgent(BaseAgent):
             )
             
         except Exception as e:
-            logger.error("Purchase research failed", error=str(e), exc_info=True)
-            return AgentResult(
-                success=False,
-                error=f"Purchase research failed: {str(e)}",
-            )
+            self._log.error("Purchase research failed", error=str(e), exc_info=True)
+            return error_result(f"Purchase research failed: {str(e)}")
     
-    async def _is_crypto_query(self, query: str) -> bool:
-        """Check if query is about cryptocurrency"""
-        crypto_keywords = ["bitcoin", "btc", "ethereum", "eth", "crypto", "cryptocurrency", "coin", "token"]
-        query_lower = query.lower()
-        return any(keyword in query_lower for keyword in crypto_keywords)
-    
-    async def _get_crypto_price(self, query: str) -> Dict[str, Any]:
+    async def _get_crypto_price(self, coin_id: str) -> Dict[str, Any]:
         """Get cryptocurrency price from CoinGecko"""
-        # Extract coin name from query
-        coin_id = self._extract_coin_id(query)
+        cached = _price_cache.get(coin_id)
+        if cached is not None:
+            return cached
         
+        # Concurrent misses for the same coin wait on one request
+        async with _price_locks.setdefault(coin_id, asyncio.Lock()):
+            cached = _price_cache.get(coin_id)
+            if cached is not None:
+                return cached
+            return await self._fetch_crypto_price(coin_id)
+    
+    async def _fetch_crypto_price(self, coin_id: str) -> Dict[str, Any]:
+        """Fetch cryptocurrency price from CoinGecko and cache successful results"""
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(
-                    f"{COINGECKO_API_URL}/simple/price",
-                    params={
-                        "ids": coin_id,
-                        "vs_currencies": "usd",
-                        "include_24hr_change": "true",
-                    },
-                )
-                response.raise_for_status()
-                data = response.json()
+            client = get_http_client()
+            response = await client.get(
+                f"{COINGECKO_API_URL}/simple/price",
+                params={
+                    "ids": coin_id,
+                    "vs_currencies": "usd",
+                    "include_24hr_change": "true",
+                },
+                timeout=10.0,
+            )
+            response.raise_for_status()
+            data = jsonlib.loads(response.content)
+            
+            if coin_id in data:
+                price_data = data[coin_id]
+                result = {
+                    "coin": coin_id,
+                    "price_usd": price_data.get("usd"),
+                    "change_24h": price_data.get("usd_24h_change"),
+                }
+                _price_cache.set(coin_id, result)
+                return result
+            else:
+                return {"error": f"Coin {coin_id} not found"}
                 
-                if coin_id in data:
-                    price_data = data[coin_id]
-                    return {
-                        "coin": coin_id,
-                        "price_usd": price_data.get("usd"),
-                        "change_24h": price_data.get("usd_24h_change"),
-                    }
-                else:
-                    return {"error": f"Coin {coin_id} not found"}
-                    
         except Exception as e:
-            logger.warning("CoinGecko API failed", error=str(e))
+            self._log.warning("CoinGecko API failed", error=str(e))
             return {"error": f"Failed to fetch price: {str(e)}"}
     
-    def _extract_coin_id(self, query: str) -> str:
-        """Extract coin ID from query (simplified mapping)"""
-        query_lower = query.lower()
-        coin_mapping = {
-            "bitcoin": "bitcoin",
-            "btc": "bitcoin",
-            "ethereum": "ethereum",
-            "eth": "ethereum",
-            "solana": "solana",
-            "sol": "solana",
-            "cardano": "cardano",
-            "ada": "cardano",
-        }
-        
-        for keyword, coin_id in coin_mapping.items():
-            if keyword in query_lower:
-                return coin_id
-        
-        # Default to bitcoin if no match
-        return "bitcoin"
-    
     async def _research_products(self, query: str) -> List[Dict[str, Any]]:
         """Research products using Brave Search + scraping"""
-        # Reuse ResearchAgent's search logic
-        from app.agents.research_agent import ResearchAgent
-        
-        research_agent = ResearchAgent("research_temp", "Research Agent", "")
+        # Reuse the registry's cached ResearchAgent for its search logic
+        research_agent: ResearchAgent = registry.get("research")
         sources = await research_agent._search_sources(f"{query} product review price")
         
         # Process sources to extract product info
@@ -182,38 +206,25 @@ Provide:
 Return JSON with keys: recommendation, factors (array), pros (array), cons (array)"""
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {groq_api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": "llama-3.1-70b-versatile",
-                        "messages": [
-                            {"role": "system", "content": "You are a product comparison assistant. Return JSON only."},
-                            {"role": "user", "content": prompt},
-                        ],
-                        "temperature": 0.3,
-                        "response_format": {"type": "json_object"},
-                    },
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                content = data["choices"][0]["message"]["content"]
-                comparison = json.loads(content)
-                
-                return {
-                    "recommendation": comparison.get("recommendation", ""),
-                    "factors": comparison.get("factors", []),
-                    "pros": comparison.get("pros", []),
-                    "cons": comparison.get("cons", []),
-                }
-                
+            # Streamed, and shared with any identical in-flight or recent prompt
+            comparison = await cached_groq_json(
+                groq_api_key,
+                [
+                    {"role": "system", "content": "You are a product comparison assistant. Return JSON only."},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.3,
+            )
+            
+            return {
+                "recommendation": comparison.get("recommendation", ""),
+                "factors": comparison.get("factors", []),
+                "pros": comparison.get("pros", []),
+                "cons": comparison.get("cons", []),
+            }
+            
         except Exception as e:
-            logger.warning("Product comparison failed", error=str(e))
+            self._log.warning("Product comparison failed", error=str(e))
             return {
                 "recommendation": f"Found {len(products)} products. Review sources for detailed comparison.",
                 "factors": ["price", "quality", "reviews"],
@@ -222,15 +233,23 @@ Return JSON with keys: recommendation, factors (array), pros (array), cons (arra
     async def _analyze_budget(self, products: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Analyze budget for products"""
         # Extract prices if available
-        prices = [p.get("price") for p in products if p.get("price")]
+        prices = [price for p in products if (price := p.get("price")) is not None]
+        
+        if not prices:
+            return {
+                "products_analyzed": len(products),
+                "price_range": {"min": None, "max": None},
+                "average_price": None,
+                "note": "Prices extracted from research sources",
+            }
         
         return {
             "products_analyzed": len(products),
             "price_range": {
-                "min": min(prices) if prices else None,
-                "max": max(prices) if prices else None,
+                "min": min(prices),
+                "max": max(prices),
             },
-            "average_price": sum(prices) / len(prices) if prices else None,
+            "average_price": sum(prices) / len(prices),
             "note": "Prices extracted from research sources",
         }
     
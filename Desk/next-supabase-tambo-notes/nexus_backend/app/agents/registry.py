@@ -11,13 +11,20 @@ logger = structlog.get_logger()
 class AgentRegistry:
     """Registry for agent types and instances"""
     
+    __slots__ = ("_agent_classes", "_agent_instances", "_list_all_cache")
+    
     _instance: Optional['AgentRegistry'] = None
-    _agent_classes: Dict[str, Type[BaseAgent]] = {}
-    _agent_instances: Dict[str, BaseAgent] = {}
+    _agent_classes: Dict[str, Type[BaseAgent]]
+    _agent_instances: Dict[str, BaseAgent]
+    _list_all_cache: Optional[List[Dict[str, Any]]]
     
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
+            instance = super().__new__(cls)
+            instance._agent_classes = {}
+            instance._agent_instances = {}
+            instance._list_all_cache = None
+            cls._instance = instance
         return cls._instance
     
     def register(self, agent_id: str, name: str, description: str = ""):
@@ -37,6 +44,7 @@ class AgentRegistry:
                 "description": description,
             }
             self._agent_classes[agent_id] = agent_class
+            self._list_all_cache = None
             logger.info("Agent registered", agent_id=agent_id, name=name)
             return agent_class
         return decorator
@@ -47,12 +55,13 @@ class AgentRegistry:
         Creates instance if it doesn't exist.
         """
         # Check if instance already exists
-        if agent_id in self._agent_instances:
-            return self._agent_instances[agent_id]
+        instance = self._agent_instances.get(agent_id)
+        if instance is not None:
+            return instance
         
         # Create new instance from registered class
-        if agent_id in self._agent_classes:
-            agent_class = self._agent_classes[agent_id]
+        agent_class = self._agent_classes.get(agent_id)
+        if agent_class is not None:
             instance = agent_class(agent_id=agent_id, **kwargs)
             self._agent_instances[agent_id] = instance
             return instance
@@ -61,7 +70,10 @@ class AgentRegistry:
         return None
     
     def list_all(self) -> List[Dict[str, Any]]:
-        """List all registered agents with metadata"""
+        """List all registered agents with metadata (cached until the next register)"""
+        if self._list_all_cache is not None:
+            return self._list_all_cache
+        
         agents = []
         for agent_id, agent_class in self._agent_classes.items():
             # Get metadata from registry or create instance
@@ -84,14 +96,19 @@ class AgentRegistry:
                     "name": agent_id,
                     "description": "Agent metadata unavailable",
                 })
+        self._list_all_cache = agents
         return agents
     
     def get_agent_info(self, agent_id: str) -> Optional[Dict[str, Any]]:
-        """Get metadata for a specific agent"""
+        """Get metadata for a specific agent without instantiating it"""
+        agent_class = self._agent_classes.get(agent_id)
+        if agent_class is None:
+            return None
+        metadata = getattr(agent_class, "_registry_metadata", None)
+        if metadata is not None:
+            return dict(metadata)
         agent = self.get(agent_id)
-        if agent:
-            return agent.get_metadata()
-        return None
+        return agent.get_metadata() if agent else None
     
     def is_registered(self, agent_id: str) -> bool:
         """Check if an agent is registered"""
@@ -1,19 +1,97 @@
 """
 Research Agent - Web research using Brave Search + scraping + summarization
 """
-from typing import Dict, Any, Optional, List
-from app.agents.base import BaseAgent, AgentResult
+from typing import Dict, Any, Optional, List, Tuple
+from app.agents.base import BaseAgent, AgentResult, error_result
 from app.agents.registry import registry
 from app.config import settings
+from app.utils import jsonlib
+from app.utils.cache import SingleFlight, TTLCache
+from app.utils.http_client import get_http_client, is_retryable, retry_delay
+from app.utils.llm import GROQ_CHAT_URL, GROQ_MODEL
+from urllib.parse import urlsplit
+import anyio
+import asyncio
 import httpx
-from bs4 import BeautifulSoup
-import structlog
-
-logger = structlog.get_logger()
+import re
+import weakref
+import lxml.html
+from lxml import etree
 
 BRAVE_API_KEY = getattr(settings, "BRAVE_API_KEY", None)
+GROQ_API_KEY = getattr(settings, "GROQ_API_KEY", None)
 MAX_SOURCES = 5
 MAX_CONTENT_LENGTH = 5000  # Characters per source
+SCRAPE_BUDGET_SECONDS = 6.0  # Overall deadline for scraping all sources
+MAX_SCRAPE_BYTES = 256 * 1024  # HTML read per page before parsing
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+MAX_REQUESTS_PER_HOST = 4
+SCRAPE_MAX_ATTEMPTS = 3
+SCRAPE_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+# Fail fast on unreachable hosts while still allowing slow pages to stream in
+WEB_TIMEOUT = httpx.Timeout(connect=3.0, read=10.0, write=5.0, pool=10.0)
+# Elements whose text never belongs in scraped page content
+NON_CONTENT_TAGS = ("script", "style", "noscript", "svg", "template", "iframe")
+GROQ_MODELS_URL = "https://api.groq.com/openai/v1/models"  # Cheap endpoint used to warm the connection
+
+# Kept constant across calls so Groq can reuse the cached prompt prefix
+SUMMARY_SYSTEM_PROMPT = """You are a research assistant. Return JSON only.
+
+Based on the research sources in the user's message, provide:
+1. A comprehensive summary
+2. Key findings (as a list)
+3. Recommendations (as a list)
+
+Return JSON with keys: summary, findings (array), recommendations (array)"""
+
+
+SEARCH_CACHE_TTL_SECONDS = 900
+PAGE_CACHE_TTL_SECONDS = 1800
+
+# Search results keyed by (search method, normalized query) and page text keyed by URL;
+# concurrent duplicate lookups share one upstream call
+_search_cache = TTLCache(ttl=SEARCH_CACHE_TTL_SECONDS, maxsize=1024)
+_page_cache = TTLCache(ttl=PAGE_CACHE_TTL_SECONDS, maxsize=4096)
+_search_flight = SingleFlight()
+_page_flight = SingleFlight()
+
+
+def parse_html(content: bytes, encoding: Optional[str] = None) -> lxml.html.HtmlElement:
+    """Parse an HTML document with lxml, honouring the HTTP charset when known"""
+    parser = lxml.html.HTMLParser(encoding=encoding) if encoding else None
+    return lxml.html.document_fromstring(content, parser=parser)
+
+
+def element_text(element: lxml.html.HtmlElement, separator: str = "") -> str:
+    """Join an element's stripped text fragments, skipping empty ones"""
+    return separator.join(
+        text for text in (fragment.strip() for fragment in element.itertext()) if text
+    )
+
+
+def has_class(tag: str, css_class: str) -> str:
+    """XPath step matching `tag.css_class` (cssselect isn't a dependency)"""
+    return f"{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {css_class} ')]"
+
+
+# DuckDuckGo result selectors, compiled once and reused for every search
+DDG_RESULT_XPATH = etree.XPath("//" + has_class("div", "result"))
+DDG_TITLE_XPATH = etree.XPath(".//" + has_class("a", "result__a"))
+DDG_SNIPPET_XPATH = etree.XPath(".//" + has_class("a", "result__snippet"))
+# Nodes dropped (without their tail text) before extracting page text
+STRIPPED_NODES = (*NON_CONTENT_TAGS, etree.Comment)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+EMPTY_PAGE: Tuple[str, int] = ("", 0)
+
+
+def page_text(document: lxml.html.HtmlElement) -> Tuple[str, int]:
+    """
+    Whitespace-normalized page text capped at MAX_CONTENT_LENGTH, plus the
+    length of the full extracted text. Only a bounded prefix is normalized.
+    """
+    raw = " ".join(document.itertext())
+    text = WHITESPACE_PATTERN.sub(" ", raw[:MAX_CONTENT_LENGTH * 4]).strip()
+    return text[:MAX_CONTENT_LENGTH], len(raw)
 
 
 @registry.register("research", "Research Agent", "Researches topics using web search and summarization")
@@ -22,29 +100,27 @@ class ResearchAgent(BaseAgent):
     
     def __init__(self, agent_id: str, name: str = "Research Agent", description: str = ""):
         super().__init__(agent_id, name, description or "Researches topics using web search and summarization")
-        self.brave_api_key = BRAVE_API_KEY or settings.BRAVE_API_KEY if hasattr(settings, "BRAVE_API_KEY") else None
+        self.brave_api_key = BRAVE_API_KEY
+        self._host_semaphores: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = weakref.WeakValueDictionary()
     
     async def execute(self, task: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> AgentResult:
         """Execute research task"""
         query = task.get("query") or task.get("message") or task.get("text", "")
         if not query:
-            return AgentResult(
-                success=False,
-                error="Query is required for research",
-            )
+            return error_result("Query is required for research")
         
         try:
             # Step 1: Search for sources
             sources = await self._search_sources(query)
             
             if not sources:
-                return AgentResult(
-                    success=False,
-                    error="No sources found for query",
-                )
+                return error_result("No sources found for query")
             
-            # Step 2: Scrape and process content
-            processed_sources = await self._scrape_and_process(sources)
+            # Step 2: Scrape and process content, warming the Groq connection meanwhile
+            processed_sources, _ = await asyncio.gather(
+                self._scrape_and_process(sources),
+                self._prewarm_groq(),
+            )
             
             # Step 3: Summarize using Groq
             summary = await self._summarize(query, processed_sources)
@@ -65,167 +141,242 @@ class ResearchAgent(BaseAgent):
             )
             
         except Exception as e:
-            logger.error("Research agent execution failed", error=str(e), exc_info=True)
-            return AgentResult(
-                success=False,
-                error=f"Research failed: {str(e)}",
-            )
+            self._log.error("Research agent execution failed", error=str(e), exc_info=True)
+            return error_result(f"Research failed: {str(e)}")
     
     async def _search_sources(self, query: str) -> List[Dict[str, Any]]:
-        """Search for sources using Brave API or DuckDuckGo fallback"""
-        if self.brave_api_key:
-            return await self._search_brave(query)
-        else:
-            return await self._search_duckduckgo(query)
+        """Search for sources using Brave API or DuckDuckGo fallback (cached)"""
+        method = "brave" if self.brave_api_key else "duckduckgo"
+        key = (method, " ".join(query.lower().split()))
+        cached = _search_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        search = self._search_brave if self.brave_api_key else self._search_duckduckgo
+        sources = await _search_flight.do(key, lambda: search(query))
+        if sources:  # Failed searches come back empty and aren't cached
+            _search_cache.set(key, sources)
+        return sources
     
     async def _search_brave(self, query: str) -> List[Dict[str, Any]]:
         """Search using Brave Search API"""
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                response = await client.get(
-                    "https://api.search.brave.com/res/v1/web/search",
-                    headers={
-                        "Accept": "application/json",
-                        "X-Subscription-Token": self.brave_api_key,
-                    },
-                    params={
-                        "q": query,
-                        "count": MAX_SOURCES,
-                    },
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                sources = []
-                for result in data.get("web", {}).get("results", [])[:MAX_SOURCES]:
-                    sources.append({
-                        "title": result.get("title", ""),
-                        "url": result.get("url", ""),
-                        "description": result.get("description", ""),
-                    })
-                
-                logger.info("Brave search completed", query=query, sources_found=len(sources))
-                return sources
-                
+            client = get_http_client()
+            response = await client.get(
+                "https://api.search.brave.com/res/v1/web/search",
+                headers={
+                    "Accept": "application/json",
+                    "X-Subscription-Token": self.brave_api_key,
+                },
+                params={
+                    "q": query,
+                    "count": MAX_SOURCES,
+                },
+                timeout=WEB_TIMEOUT,
+            )
+            response.raise_for_status()
+            data = jsonlib.loads(response.content)
+            
+            sources = []
+            for result in data.get("web", {}).get("results", [])[:MAX_SOURCES]:
+                sources.append({
+                    "title": result.get("title", ""),
+                    "url": result.get("url", ""),
+                    "description": result.get("description", ""),
+                })
+            
+            self._log.info("Brave search completed", query=query, sources_found=len(sources))
+            return sources
+            
         except Exception as e:
-            logger.warning("Brave search failed, falling back to DuckDuckGo", error=str(e))
+            self._log.warning("Brave search failed, falling back to DuckDuckGo", error=str(e))
             return await self._search_duckduckgo(query)
     
     async def _search_duckduckgo(self, query: str) -> List[Dict[str, Any]]:
         """Fallback: Search using DuckDuckGo HTML scraping"""
         try:
-            async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-                response = await client.get(
-                    "https://html.duckduckgo.com/html/",
-                    params={"q": query},
-                    headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"},
-                )
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.text, "html.parser")
-                sources = []
-                
-                for result in soup.select("div.result")[:MAX_SOURCES]:
-                    title_elem = result.select_one("a.result__a")
-                    snippet_elem = result.select_one("a.result__snippet")
-                    
-                    if title_elem:
-                        sources.append({
-                            "title": title_elem.get_text(strip=True),
-                            "url": title_elem.get("href", ""),
-                            "description": snippet_elem.get_text(strip=True) if snippet_elem else "",
-                        })
-                
-                logger.info("DuckDuckGo search completed", query=query, sources_found=len(sources))
-                return sources
+            client = get_http_client()
+            response = await client.get(
+                "https://html.duckduckgo.com/html/",
+                params={"q": query},
+                headers={"User-Agent": SCRAPE_USER_AGENT},
+                timeout=WEB_TIMEOUT,
+                follow_redirects=True,
+            )
+            response.raise_for_status()
+            
+            document = parse_html(response.content, response.charset_encoding)
+            sources = []
+            
+            for result in DDG_RESULT_XPATH(document)[:MAX_SOURCES]:
+                title_elem = next(iter(DDG_TITLE_XPATH(result)), None)
+                snippet_elem = next(iter(DDG_SNIPPET_XPATH(result)), None)
                 
+                if title_elem is not None:
+                    sources.append({
+                        "title": element_text(title_elem),
+                        "url": title_elem.get("href", ""),
+                        "description": element_text(snippet_elem) if snippet_elem is not None else "",
+                    })
+            
+            self._log.info("DuckDuckGo search completed", query=query, sources_found=len(sources))
+            return sources
+            
         except Exception as e:
-            logger.error("DuckDuckGo search failed", error=str(e))
+            self._log.error("DuckDuckGo search failed", error=str(e))
             return []
     
     async def _scrape_and_process(self, sources: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Scrape content from sources and process"""
-        processed = []
+        """
+        Scrape content from sources concurrently and process. Scrapes still
+        running after SCRAPE_BUDGET_SECONDS are cancelled so one slow host
+        can't hold up the whole research task.
+        """
+        sources = [source for source in sources if source.get("url")]
+        results: List[Any] = [None] * len(sources)
+        # Caps this call's fan-out; the agent is shared, so a process-wide cap would
+        # queue concurrent research tasks behind each other (hosts have their own cap)
+        semaphore = asyncio.Semaphore(MAX_SOURCES)
+        with anyio.move_on_after(SCRAPE_BUDGET_SECONDS):
+            async with anyio.create_task_group() as task_group:
+                for index, source in enumerate(sources):
+                    task_group.start_soon(self._scrape_into, semaphore, results, index, source["url"])
         
-        for source in sources:
-            try:
-                url = source.get("url")
-                if not url:
-                    continue
-                
-                # Scrape content
-                content = await self._scrape_url(url)
-                
-                if content:
-                    processed.append({
-                        "title": source.get("title", ""),
-                        "url": url,
-                        "description": source.get("description", ""),
-                        "content": content[:MAX_CONTENT_LENGTH],  # Truncate
-                        "content_length": len(content),
-                    })
-            except Exception as e:
-                logger.warning("Failed to scrape source", url=source.get("url"), error=str(e))
+        processed = []
+        for source, page in zip(sources, results):
+            if page is None or isinstance(page, Exception):
+                error = "Timed out" if page is None else str(page)
+                self._log.warning("Failed to scrape source", url=source["url"], error=error)
                 # Include source even if scraping failed
                 processed.append({
                     "title": source.get("title", ""),
-                    "url": source.get("url", ""),
+                    "url": source["url"],
                     "description": source.get("description", ""),
                     "content": "",
-                    "error": str(e),
+                    "error": error,
+                })
+            elif page[0]:
+                content, content_length = page
+                processed.append({
+                    "title": source.get("title", ""),
+                    "url": source["url"],
+                    "description": source.get("description", ""),
+                    "content": content,  # Already truncated to MAX_CONTENT_LENGTH
+                    "content_length": content_length,
                 })
         
         return processed
     
-    async def _scrape_url(self, url: str) -> str:
-        """Scrape text content from a URL"""
+    async def _scrape_into(self, semaphore: asyncio.Semaphore, results: List[Any], index: int, url: str) -> None:
+        """Scrape a URL (bounded by the call's semaphore) into results[index]"""
+        async with semaphore:
+            try:
+                results[index] = await self._scrape_url(url)
+            except Exception as e:
+                results[index] = e
+    
+    async def _scrape_url(self, url: str) -> Tuple[str, int]:
+        """Scrape text content from a URL (cached); returns (content, content_length)"""
+        key = urlsplit(url).geturl()
+        cached = _page_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        page = await _page_flight.do(key, lambda: self._fetch_page_text(url))
+        if page[0]:  # Failed or non-HTML fetches come back empty and aren't cached
+            _page_cache.set(key, page)
+        return page
+    
+    async def _fetch_page_text(self, url: str) -> Tuple[str, int]:
+        """Fetch a URL and extract its text content"""
         try:
-            async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-                response = await client.get(
-                    url,
-                    headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"},
-                )
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.text, "html.parser")
-                
-                # Remove script and style elements
-                for script in soup(["script", "style"]):
-                    script.decompose()
-                
-                # Get text content
-                text = soup.get_text(separator=" ", strip=True)
-                return text
-                
+            async with self._host_semaphore(urlsplit(url).netloc):
+                for attempt in range(1, SCRAPE_MAX_ATTEMPTS + 1):
+                    try:
+                        page = await self._download_page(url)
+                        break
+                    except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                        if attempt == SCRAPE_MAX_ATTEMPTS or not is_retryable(e):
+                            raise
+                        await asyncio.sleep(retry_delay(attempt, e))
+            
+            if page is None:
+                return EMPTY_PAGE
+            body, charset = page
+            document = parse_html(body, charset)
+            
+            # Remove script/style elements and comments (keeping the text after them)
+            etree.strip_elements(document, *STRIPPED_NODES, with_tail=False)
+            
+            # Get text content
+            return page_text(document)
+            
+        except Exception as e:
+            self._log.warning("Failed to scrape URL", url=url, error=str(e))
+            return EMPTY_PAGE
+    
+    async def _download_page(self, url: str) -> Optional[Tuple[bytes, Optional[str]]]:
+        """Read up to MAX_SCRAPE_BYTES of an HTML page; None if it isn't HTML"""
+        client = get_http_client()
+        async with client.stream(
+            "GET",
+            url,
+            headers={"User-Agent": SCRAPE_USER_AGENT},
+            timeout=WEB_TIMEOUT,
+            follow_redirects=True,
+        ) as response:
+            response.raise_for_status()
+            
+            # Skip PDFs, images, etc. without downloading them
+            content_type = response.headers.get("content-type", "").lower()
+            if content_type and not content_type.startswith(HTML_CONTENT_TYPES):
+                return None
+            
+            # Only the first MAX_CONTENT_LENGTH characters are kept, so stop reading early
+            body = bytearray()
+            async for chunk in response.aiter_bytes(chunk_size=16384):
+                body.extend(chunk)
+                if len(body) >= MAX_SCRAPE_BYTES:
+                    break
+            return bytes(body), response.charset_encoding
+    
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        """Per-host concurrency limit; entries drop out once no request holds them"""
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(MAX_REQUESTS_PER_HOST)
+            self._host_semaphores[host] = semaphore
+        return semaphore
+    
+    async def _prewarm_groq(self) -> None:
+        """Open a pooled connection to Groq so the summarize call skips the TLS handshake"""
+        groq_api_key = GROQ_API_KEY
+        if not groq_api_key:
+            return
+        try:
+            client = get_http_client()
+            await client.get(
+                GROQ_MODELS_URL,
+                headers={"Authorization": f"Bearer {groq_api_key}"},
+                timeout=WEB_TIMEOUT,
+            )
         except Exception as e:
-            logger.warning("Failed to scrape URL", url=url, error=str(e))
-            return ""
+            self._log.debug("Groq prewarm failed", error=str(e))
     
     async def _summarize(self, query: str, sources: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Summarize research using Groq"""
-        from app.services.intent_parser import parse_intent_groq
-        
-        # Prepare context from sources
-        context_text = "\n\n".join([
-            f"Source {i+1}: {s.get('title', '')}\n{s.get('content', s.get('description', ''))[:1000]}"
-            for i, s in enumerate(sources[:3])  # Use top 3 sources for summary
+        # Only the query and sources vary; the instructions stay a byte-identical prefix
+        prompt = "".join([
+            f"Query: {query}\n\nSources:",
+            *(
+                f"\n\nSource {i+1}: {s.get('title', '')}\n{s.get('content', s.get('description', ''))[:1000]}"
+                for i, s in enumerate(sources[:3])  # Use top 3 sources for summary
+            ),
         ])
         
-        prompt = f"""Based on the following research sources, provide:
-1. A comprehensive summary
-2. Key findings (as a list)
-3. Recommendations (as a list)
-
-Query: {query}
-
-Sources:
-{context_text}
-
-Return JSON with keys: summary, findings (array), recommendations (array)"""
-        
         try:
             # Use Groq for summarization (reusing intent parser's Groq function)
-            groq_api_key = getattr(settings, "GROQ_API_KEY", None)
+            groq_api_key = GROQ_API_KEY
             if not groq_api_key:
                 # Fallback to simple summary
                 return {
@@ -234,38 +385,38 @@ Return JSON with keys: summary, findings (array), recommendations (array)"""
                     "recommendations": ["Review the sources for more details"],
                 }
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    "https://api.groq.com/openai/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {groq_api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": "llama-3.1-70b-versatile",
-                        "messages": [
-                            {"role": "system", "content": "You are a research assistant. Return JSON only."},
-                            {"role": "user", "content": prompt},
-                        ],
-                        "temperature": 0.3,
-                        "response_format": {"type": "json_object"},
-                    },
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                import json
-                content = data["choices"][0]["message"]["content"]
-                result = json.loads(content)
-                
-                return {
-                    "summary": result.get("summary", ""),
-                    "findings": result.get("findings", []),
-                    "recommendations": result.get("recommendations", []),
-                }
-                
+            client = get_http_client()
+            response = await client.post(
+                GROQ_CHAT_URL,
+                headers={
+                    "Authorization": f"Bearer {groq_api_key}",
+                    "Content-Type": "application/json",
+                },
+                json={
+                    "model": GROQ_MODEL,
+                    "messages": [
+                        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                        {"role": "user", "content": prompt},
+                    ],
+                    "temperature": 0.3,
+                    "response_format": {"type": "json_object"},
+                },
+                timeout=30.0,
+            )
+            response.raise_for_status()
+            data = jsonlib.loads(response.content)
+            
+            content = data["choices"][0]["message"]["content"]
+            result = jsonlib.loads(content)
+            
+            return {
+                "summary": result.get("summary", ""),
+                "findings": result.get("findings", []),
+                "recommendations": result.get("recommendations", []),
+            }
+            
         except Exception as e:
-            logger.warning("Groq summarization failed, using fallback", error=str(e))
+            self._log.warning("Groq summarization failed, using fallback", error=str(e))
             # Fallback summary
             return {
                 "summary": f"Research on '{query}' found {len(sources)} sources. Review the sources for detailed information.",
@@ -4,30 +4,41 @@ FastAPI dependencies for authentication and database
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from uuid import UUID
 from app.database import get_db
-from app.services.auth_service import decode_token, get_user_by_id
+from app.services.auth_service import decode_token_async, get_active_user
 from app.models.user import User
 from app.exceptions import AuthenticationError
 import structlog
 
 logger = structlog.get_logger()
 
-# HTTP Bearer token scheme
-security = HTTPBearer()
+# HTTP Bearer token scheme; a missing token is rejected in get_current_user
+# with a single 401 rather than HTTPBearer's own 403
+security = HTTPBearer(auto_error=False)
 
 
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     db: AsyncSession = Depends(get_db),
 ) -> User:
     """
     Dependency to get the current authenticated user from JWT token.
-    Returns 401 if token is invalid or user not found.
+    Returns 401 if the token is missing or invalid, or the user is not found.
+    """
+    if credentials is None:
+        raise AuthenticationError("Not authenticated")
+    return await authenticate_token(db, credentials.credentials)
+
+
+async def authenticate_token(db: AsyncSession, token: str) -> User:
+    """
+    Resolve an access token to its active user, raising AuthenticationError.
+    Shared by get_current_user and endpoints that can't use HTTPBearer (WebSockets).
     """
-    token = credentials.credentials
-    
     try:
-        payload = decode_token(token)
+        payload = await decode_token_async(token)
         user_id: str = payload.get("sub")
         token_type: str = payload.get("type")
         
@@ -37,12 +48,10 @@ async def get_current_user(
         if token_type != "access":
             raise AuthenticationError("Invalid token type")
         
-        user = await get_user_by_id(db, user_id)
+        # Cached across requests for a short TTL; the token itself was verified above
+        user = await get_active_user(db, UUID(user_id))  # Parsed once, here
         if user is None:
-            raise AuthenticationError("User not found")
-        
-        if not user.is_active:
-            raise AuthenticationError("User is inactive")
+            raise AuthenticationError("User not found or inactive")
         
         return user
         
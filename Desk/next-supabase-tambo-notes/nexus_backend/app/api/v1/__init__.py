@@ -2,9 +2,11 @@
 API v1 routes
 """
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
 from app.api.v1 import auth_simple as auth, tasks, intent, budget, agents, events
 
-router = APIRouter()
+# orjson serializes response bodies several times faster than the stdlib encoder
+router = APIRouter(default_response_class=ORJSONResponse)
 
 # Include route modules
 router.include_router(auth.router, prefix="/auth", tags=["authentication"])
@@ -1,15 +1,22 @@
 """
 Agents API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
-from app.database import get_db
+from datetime import datetime
+from typing import Any, Dict
+from uuid import UUID
+from app.database import AsyncSessionLocal, get_db
 from app.api.dependencies import get_current_user
 from app.models.user import User
 from app.models.agent import Agent, AgentType, AgentStatus
-from app.models.task import Task
+from app.models.task import Task, TaskStatus
+from app.schemas.agent import ActiveAgentResponse, ActiveAgentListResponse
+from app.agents.base import AgentResult
 from app.agents.registry import registry
+from app.services.event_service import event_service
+from app.services.policy_service import PolicyService
 import structlog
 
 logger = structlog.get_logger()
@@ -27,45 +34,37 @@ async def list_agent_types():
     }
 
 
-@router.get("/active")
+@router.get("/active", response_model=ActiveAgentListResponse)
 async def list_active_agents(
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     """List active agents for current user with statistics"""
-    result = await db.execute(
-        select(Agent)
+    # Agents and their task counts in one query (LEFT JOIN keeps agents with no tasks).
+    # Plain column rows, streamed in chunks: no ORM objects or identity map
+    # bookkeeping for rows that are only serialized
+    result = await db.stream(
+        select(
+            Agent.id,
+            Agent.name,
+            Agent.agent_type,
+            Agent.status,
+            Agent.capabilities,
+            Agent.created_at,
+            func.count(Task.id).label("task_count"),
+        )
+        .outerjoin(Task, Task.assigned_agent_id == Agent.id)
         .where(
             Agent.created_by == current_user.id,
             Agent.status == AgentStatus.BUSY
         )
+        .group_by(Agent.id)
+        .execution_options(yield_per=100)
     )
-    agents = result.scalars().all()
     
-    # Get stats for each agent
-    agents_with_stats = []
-    for agent in agents:
-        # Count tasks for this agent
-        task_count_result = await db.execute(
-            select(func.count(Task.id))
-            .where(Task.assigned_agent_id == agent.id)
-        )
-        task_count = task_count_result.scalar() or 0
-        
-        agents_with_stats.append({
-            "id": str(agent.id),
-            "name": agent.name,
-            "agent_type": agent.agent_type.value,
-            "status": agent.status.value,
-            "capabilities": agent.capabilities,
-            "task_count": task_count,
-            "created_at": agent.created_at.isoformat(),
-        })
+    agents_with_stats = [ActiveAgentResponse.model_validate(row) async for row in result.mappings()]
     
-    return {
-        "agents": agents_with_stats,
-        "count": len(agents_with_stats),
-    }
+    return ActiveAgentListResponse(agents=agents_with_stats, count=len(agents_with_stats))
 
 
 @router.get("/types/{agent_type}")
@@ -85,14 +84,101 @@ async def get_agent_type_info(agent_type: str):
     }
 
 
+def agent_result_payload(result: AgentResult) -> Dict[str, Any]:
+    """The JSON form of an agent result returned to clients and stored on tasks"""
+    return {
+        "success": result.success,
+        "data": result.data,
+        "error": result.error,
+        "execution_time_ms": result.execution_time_ms,
+        "requires_approval": result.requires_approval,
+        "estimated_cost": result.estimated_cost,
+        "risk_level": result.risk_level,
+        "sources": result.sources,
+    }
+
+
+async def run_agent_task(
+    task_id: UUID,
+    agent_type: str,
+    task: Dict[str, Any],
+    context: Dict[str, Any],
+    user_id: UUID,
+) -> None:
+    """
+    Background half of execute_agent: run the agent, store its result on the
+    task row and publish the final status (which wakes the task's WebSocket).
+    """
+    agent = registry.get(agent_type)
+    
+    async with AsyncSessionLocal() as db:
+        agent_task = await db.get(Task, task_id)
+        if agent_task is None:
+            # Deleted while still pending, before the background run started
+            logger.info("Agent task no longer exists, skipping run", task_id=str(task_id), agent_type=agent_type)
+            return
+        
+        try:
+            agent_task.status = TaskStatus.IN_PROGRESS
+            agent_task.started_at = datetime.utcnow()
+            await db.commit()
+            
+            # run() turns agent exceptions into a failed AgentResult
+            result = await agent.run(task, context)
+            
+            final_status = TaskStatus.COMPLETED if result.success else TaskStatus.FAILED
+            error = result.error
+            agent_task.result = agent_result_payload(result)
+            agent_task.status = final_status
+            agent_task.error_message = error
+            agent_task.completed_at = datetime.utcnow()
+            await db.commit()
+        except Exception as e:
+            # A database error mustn't leave the task IN_PROGRESS forever
+            await db.rollback()
+            final_status = TaskStatus.FAILED
+            error = PolicyService.sanitize_error_message(e)
+            logger.error("Agent task failed", task_id=str(task_id), agent_type=agent_type, error=error)
+            agent_task.status = final_status
+            agent_task.error_message = f"Agent execution error: {error}"
+            agent_task.completed_at = datetime.utcnow()
+            try:
+                await db.commit()
+            except Exception as commit_error:
+                logger.error(
+                    "Could not mark agent task failed",
+                    task_id=str(task_id),
+                    error=PolicyService.sanitize_error_message(commit_error),
+                )
+    
+    await event_service.publish(
+        user_id,
+        "status_changed",
+        {
+            "task_id": str(task_id),
+            "status": final_status.value,
+            "previous_status": TaskStatus.IN_PROGRESS.value,
+            "error": error,
+        }
+    )
+
+
 @router.post("/{agent_type}/execute")
 async def execute_agent(
     agent_type: str,
     task: dict,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    wait: bool = False,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Execute an agent with a task"""
+    """
+    Execute an agent with a task.
+    Responds 202 with a task id right away and runs the agent in the background;
+    follow it with GET /tasks/{task_id} or the task's WebSocket. With ?wait=true
+    the agent runs inline and its result is returned directly.
+    """
     agent = registry.get(agent_type)
     
     if not agent:
@@ -107,19 +193,28 @@ async def execute_agent(
         "user_email": current_user.email,
     }
     
-    # Execute agent
-    result = await agent.run(task, context)
+    if wait:
+        result = await agent.run(task, context)
+        return {
+            "agent_type": agent_type,
+            "result": agent_result_payload(result),
+        }
+    
+    agent_task = Task(
+        title=f"{agent_type} agent",
+        command=agent_type,
+        parameters=task,
+        created_by=current_user.id,
+        status=TaskStatus.PENDING,
+    )
+    db.add(agent_task)
+    await db.commit()  # The background run loads the task in its own session
     
+    background_tasks.add_task(run_agent_task, agent_task.id, agent_type, task, context, current_user.id)
+    logger.info("Agent task queued", task_id=str(agent_task.id), agent_type=agent_type)
+    
+    response.status_code = status.HTTP_202_ACCEPTED
     return {
-        "agent_type": agent_type,
-        "result": {
-            "success": result.success,
-            "data": result.data,
-            "error": result.error,
-            "execution_time_ms": result.execution_time_ms,
-            "requires_approval": result.requires_approval,
-            "estimated_cost": result.estimated_cost,
-            "risk_level": result.risk_level,
-            "sources": result.sources,
-        },
+        "task_id": str(agent_task.id),
+        "status": "accepted",
     }
@@ -12,20 +12,42 @@ from app.services.auth_service import (
     decode_token,
     get_user_by_email,
 )
-from app.schemas.user import UserCreate, UserResponse, UserLogin
+from app.schemas.user import UserCreate, UserResponse, UserLogin, TokenBundleResponse
 from app.api.dependencies import get_current_user
 from app.models.user import User
 from app.exceptions import ConflictError, AuthenticationError
 from datetime import timedelta
 from app.config import settings
+from typing import Optional
+import re
 import structlog
 
 logger = structlog.get_logger()
 
 router = APIRouter()
 
+# One case-insensitive pass classifies database failures; each group names an error kind
+_DB_ERROR_PATTERN = re.compile(
+    r"(?P<connection>10060|connect call failed|connection|multiple exceptions)"
+    r"|(?P<dns>getaddrinfo failed|11001|gaierror)"
+    r"|(?P<auth>password authentication failed|asyncpg)"
+    r"|(?P<table>does not exist|relation|table)",
+    re.IGNORECASE,
+)
+# When several kinds match, the first one listed wins
+_DB_ERROR_PRIORITY = ("connection", "dns", "auth", "table")
+
+
+def _classify_db_error(error: Exception) -> Optional[str]:
+    """Return the database error kind for an exception, or None if it isn't one"""
+    kinds = {match.lastgroup for match in _DB_ERROR_PATTERN.finditer(str(error))}
+    error_type = type(error).__name__
+    if error_type == "OSError" or "operationalerror" in error_type.lower():
+        kinds.add("connection")
+    return next((kind for kind in _DB_ERROR_PRIORITY if kind in kinds), None)
+
 
-@router.post("/register", response_model=dict, status_code=status.HTTP_201_CREATED)
+@router.post("/register", response_model=TokenBundleResponse, status_code=status.HTTP_201_CREATED)
 async def register(
     user_data: UserCreate,
     db: AsyncSession = Depends(get_db),
@@ -55,12 +77,11 @@ async def register(
         
         logger.info("User registered", user_id=str(user.id), email=user.email)
         
-        return {
-            "user": UserResponse.model_validate(user),
-            "access_token": access_token,
-            "refresh_token": refresh_token,
-            "token_type": "bearer",
-        }
+        return TokenBundleResponse(
+            user=UserResponse.model_validate(user),
+            access_token=access_token,
+            refresh_token=refresh_token,
+        )
         
     except ConflictError as e:
         raise HTTPException(
@@ -70,29 +91,26 @@ async def register(
     except Exception as e:
         error_msg = str(e)
         error_type = type(e).__name__
-        # Check if it's a database connection error
-        if "10060" in error_msg or "connect call failed" in error_msg.lower() or "connection" in error_msg.lower() or "operationalerror" in error_type.lower():
+        error_kind = _classify_db_error(e)
+        if error_kind == "connection":
             logger.error("Database connection failed", error=error_msg)
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Database connection failed. Please check your DATABASE_URL in .env file and ensure the database is accessible."
             ) from e
-        # Check if it's a DNS resolution error
-        if "getaddrinfo failed" in error_msg.lower() or "11001" in error_msg or "gaierror" in error_msg.lower():
+        if error_kind == "dns":
             logger.error("DNS resolution failed for database", error=error_msg)
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail=f"DNS resolution failed for database hostname. Check your DATABASE_URL in .env file. Error: {error_msg}"
             ) from e
-        # Check if it's a password authentication error
-        if "password authentication failed" in error_msg.lower() or "asyncpg" in error_msg.lower():
+        if error_kind == "auth":
             logger.error("Database authentication failed", error=error_msg)
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Database authentication failed. Please check your DATABASE_URL password in .env file."
             ) from e
-        # Check if it's a table doesn't exist error
-        if "does not exist" in error_msg.lower() or "relation" in error_msg.lower() or "table" in error_msg.lower() or "no such table" in error_msg.lower():
+        if error_kind == "table":
             logger.error("Database table missing", error=error_msg)
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -106,7 +124,7 @@ async def register(
         ) from e
 
 
-@router.post("/login", response_model=dict)
+@router.post("/login", response_model=TokenBundleResponse)
 async def login(
     login_data: UserLogin,
     db: AsyncSession = Depends(get_db),
@@ -137,12 +155,11 @@ async def login(
         
         logger.info("User logged in", user_id=str(user.id), email=user.email)
         
-        return {
-            "access_token": access_token,
-            "refresh_token": refresh_token,
-            "token_type": "bearer",
-            "user": UserResponse.model_validate(user),
-        }
+        return TokenBundleResponse(
+            user=UserResponse.model_validate(user),
+            access_token=access_token,
+            refresh_token=refresh_token,
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -151,15 +168,7 @@ async def login(
         logger.error("Login failed", error=error_msg, error_type=error_type, exc_info=True)
         
         # Check for database connection errors (OSError, OperationalError, etc.)
-        is_db_error = (
-            "10060" in error_msg or 
-            "connect call failed" in error_msg.lower() or 
-            "connection" in error_msg.lower() or 
-            "operationalerror" in error_type.lower() or
-            error_type == "OSError" or
-            "multiple exceptions" in error_msg.lower() or
-            "errno 10060" in error_msg.lower()
-        )
+        is_db_error = _classify_db_error(e) == "connection"
         
         if is_db_error:
             raise HTTPException(
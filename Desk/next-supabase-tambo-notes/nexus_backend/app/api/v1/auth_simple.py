@@ -4,15 +4,89 @@ No database connection required
 """
 from fastapi import APIRouter, HTTPException, status, Depends, Header
 from pydantic import BaseModel, EmailStr
+from typing import Any, Dict, Optional
 from app.services.supabase_auth import supabase_auth
 from app.config import settings
+from app.utils import jsonlib
+from app.utils.redis_client import get_redis
+import hashlib
+import jwt
+import random
+import redis.asyncio as redis
 import structlog
+import time
 
 logger = structlog.get_logger()
 
 router = APIRouter()
 
 
+def user_cache_ttl(token: str) -> int:
+    """
+    Seconds to cache the Supabase user for a token: TOKEN_CACHE_TTL, capped at
+    the time left before the token's own `exp`, shortened by a random jitter
+    so entries created together expire spread out instead of sending a burst
+    of misses to Supabase. 0 means don't cache (expiring or no `exp` claim).
+    """
+    try:
+        # Supabase has just accepted the token, so its signature isn't re-checked here
+        expires_at = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.InvalidTokenError:
+        return 0
+    if not isinstance(expires_at, (int, float)):
+        return 0
+    base_ttl = min(settings.TOKEN_CACHE_TTL, int(expires_at - time.time()))
+    if base_ttl <= 0:
+        return 0
+    return max(1, base_ttl - random.randint(0, base_ttl * settings.TOKEN_CACHE_JITTER_PCT // 100))
+
+
+def user_cache_key(token: str) -> str:
+    """Redis key for the user behind an access token (only a digest of the token is stored)"""
+    return "auth:user:" + hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    """The token from an "Authorization: Bearer <token>" header, if present"""
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    return authorization.split(" ")[1]
+
+
+async def get_supabase_user(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the Supabase user for an access token.
+    Users are cached in Redis so repeat calls skip the round-trip to Supabase
+    Auth; if Redis is unavailable Supabase is asked every time.
+    """
+    cache_key = user_cache_key(token)
+    try:
+        cached = await get_redis().get(cache_key)
+        if cached is not None:
+            return jsonlib.loads(cached)
+    except redis.RedisError as e:
+        logger.debug("User cache unavailable", error=str(e))
+    
+    user = await supabase_auth.get_user(token)
+    ttl = user_cache_ttl(token) if user else 0  # Rejected tokens aren't cached
+    if ttl:
+        try:
+            await get_redis().setex(cache_key, ttl, jsonlib.dumps(user))
+        except redis.RedisError:
+            pass
+    return user
+
+
+async def forget_supabase_user(token: Optional[str]) -> None:
+    """Drop the cached user for an access token that is being replaced or revoked"""
+    if not token:
+        return
+    try:
+        await get_redis().delete(user_cache_key(token))
+    except redis.RedisError as e:
+        logger.warning("Could not evict cached user", error=str(e))
+
+
 class UserRegister(BaseModel):
     email: EmailStr
     password: str
@@ -128,9 +202,10 @@ async def login(login_data: UserLogin):
 
 
 @router.post("/refresh")
-async def refresh_token(refresh_data: RefreshTokenRequest):
+async def refresh_token(refresh_data: RefreshTokenRequest, authorization: str = Header(None)):
     """
-    Refresh access token using refresh token
+    Refresh access token using refresh token.
+    If the old access token is sent as a Bearer header, its cached user is dropped.
     """
     if not settings.SUPABASE_URL or not settings.SUPABASE_ANON_KEY:
         raise HTTPException(
@@ -148,6 +223,7 @@ async def refresh_token(refresh_data: RefreshTokenRequest):
                 headers={"WWW-Authenticate": "Bearer"}
             )
         
+        await forget_supabase_user(bearer_token(authorization))
         return {
             "access_token": result.get("access_token"),
             "token_type": "bearer"
@@ -174,17 +250,16 @@ async def get_current_user_info(authorization: str = Header(None)):
             detail="Supabase authentication is not configured"
         )
     
-    if not authorization or not authorization.startswith("Bearer "):
+    token = bearer_token(authorization)
+    if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Missing or invalid authorization header",
             headers={"WWW-Authenticate": "Bearer"}
         )
-            
-    token = authorization.split(" ")[1]
     
     try:
-        user = await supabase_auth.get_user(token)
+        user = await get_supabase_user(token)
         
         if not user:
             raise HTTPException(
@@ -207,3 +282,34 @@ async def get_current_user_info(authorization: str = Header(None)):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get user info: {str(e)}"
         )
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(authorization: str = Header(None)):
+    """
+    Log out: revoke the session with Supabase Auth and drop the cached user,
+    so the access token stops working here at once rather than when the cache expires
+    """
+    if not settings.SUPABASE_URL or not settings.SUPABASE_ANON_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Supabase authentication is not configured"
+        )
+    
+    token = bearer_token(authorization)
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Missing or invalid authorization header",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    
+    await forget_supabase_user(token)
+    try:
+        await supabase_auth.sign_out(token)
+    except Exception as e:
+        logger.error("Logout failed", error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Logout failed: {str(e)}"
+        )
@@ -6,14 +6,18 @@ from fastapi.responses import StreamingResponse
 from app.api.dependencies import get_current_user
 from app.models.user import User
 from app.services.event_service import event_service
+from app.utils import jsonlib
 import asyncio
-import json
 import structlog
 
 logger = structlog.get_logger()
 
 router = APIRouter()
 
+# Fixed frames, encoded once; events arrive with their frame already encoded
+CONNECTED_FRAME = b'data: {"type":"connected","message":"Event stream connected"}\n\n'
+PING_FRAME = b'data: {"type":"ping"}\n\n'
+
 
 @router.get("/stream")
 async def stream_events(
@@ -37,55 +41,49 @@ async def stream_events(
     """
     async def event_generator():
         """Generator function that yields SSE events"""
-        # Queue to receive events
-        event_queue = asyncio.Queue()
-        
-        async def event_callback(event: dict):
-            """Callback to receive events from EventService"""
-            await event_queue.put(event)
-        
-        # Subscribe to events
-        event_service.subscribe(current_user.id, event_callback)
+        # Subscribe to events; EventService fills this connection's queue
+        event_queue = event_service.subscribe(current_user.id)
         
         try:
             # Send initial connection event
-            yield f"data: {json.dumps({'type': 'connected', 'message': 'Event stream connected'})}\n\n"
+            yield CONNECTED_FRAME
             
-            # Send ping every 30 seconds to keep connection alive
+            # Send ping every 30 seconds to keep connection alive. The next event and
+            # the next ping are raced directly, so the loop only wakes when one is due;
+            # a client disconnect cancels this generator (StreamingResponse listens for it)
             ping_interval = 30
-            last_ping = asyncio.get_event_loop().time()
+            get_task = asyncio.ensure_future(event_queue.get())
+            ping_task = asyncio.ensure_future(asyncio.sleep(ping_interval))
             
-            while True:
-                try:
-                    # Wait for event with timeout for ping
-                    timeout = max(1.0, ping_interval - (asyncio.get_event_loop().time() - last_ping))
+            try:
+                while True:
+                    done, _ = await asyncio.wait({get_task, ping_task}, return_when=asyncio.FIRST_COMPLETED)
                     
-                    try:
-                        event = await asyncio.wait_for(event_queue.get(), timeout=timeout)
-                        # Format as SSE
-                        yield f"id: {event.get('id', '')}\n"
-                        yield f"event: {event.get('type', 'message')}\n"
-                        yield f"data: {event.get('data', '{}')}\n\n"
-                    except asyncio.TimeoutError:
-                        # Send ping to keep connection alive
-                        current_time = asyncio.get_event_loop().time()
-                        if current_time - last_ping >= ping_interval:
-                            yield f"data: {json.dumps({'type': 'ping', 'timestamp': asyncio.get_event_loop().time()})}\n\n"
-                            last_ping = current_time
+                    if get_task in done:
+                        event = get_task.result()
+                        if event_queue.overflowed:
+                            # EventService has dropped this stalled connection; end the
+                            # stream so the client reconnects instead of missing events
+                            logger.warning("Event stream fell behind, disconnecting", user_id=str(current_user.id))
+                            break
+                        yield event["sse"]
+                        get_task = asyncio.ensure_future(event_queue.get())
                     
-                    # Check if client disconnected
-                    if await request.is_disconnected():
-                        logger.info("Client disconnected", user_id=str(current_user.id))
-                        break
-                        
-                except Exception as e:
-                    logger.error("Error in event stream", error=str(e), user_id=str(current_user.id))
-                    yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
-                    break
+                    if ping_task in done:
+                        # Send ping to keep connection alive
+                        yield PING_FRAME
+                        ping_task = asyncio.ensure_future(asyncio.sleep(ping_interval))
+            
+            except Exception as e:
+                logger.error("Error in event stream", error=str(e), user_id=str(current_user.id))
+                yield b"data: " + jsonlib.dumps_bytes({"type": "error", "message": str(e)}) + b"\n\n"
+            finally:
+                get_task.cancel()
+                ping_task.cancel()
         
         finally:
             # Unsubscribe when client disconnects
-            event_service.unsubscribe(current_user.id, event_callback)
+            event_service.unsubscribe(current_user.id, event_queue)
             logger.info("User unsubscribed from events", user_id=str(current_user.id))
     
     return StreamingResponse(
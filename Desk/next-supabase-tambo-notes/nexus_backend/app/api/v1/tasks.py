@@ -1,24 +1,84 @@
 """
 Tasks API endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, WebSocket
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from pydantic import TypeAdapter
 from uuid import UUID
+from datetime import datetime
 from typing import List, Optional
 from app.database import get_db
-from app.api.dependencies import get_current_user
+from app.api.dependencies import get_current_user, authenticate_token
 from app.models.user import User
 from app.models.task import Task, TaskStatus, TaskPriority
 from app.schemas.task import TaskCreate, TaskUpdate, TaskResponse
-from app.exceptions import NotFoundError
+from app.exceptions import AuthenticationError, NotFoundError
 from app.services.policy_service import PolicyService
+from app.services.event_service import event_service
+from app.utils import jsonlib
+import asyncio
 import structlog
 
 logger = structlog.get_logger()
 
 router = APIRouter()
 
+# Validates a whole page of ORM rows in one pydantic-core call
+TASK_LIST_ADAPTER = TypeAdapter(List[TaskResponse])
+
+FINISHED_TASK_STATUSES = frozenset({
+    TaskStatus.COMPLETED.value,
+    TaskStatus.FAILED.value,
+    TaskStatus.CANCELLED.value,
+})
+
+
+# Seconds a task WebSocket waits for an event before re-reading the task row;
+# events are fire-and-forget, so a lost one mustn't leave the socket hanging
+TASK_EVENTS_RECHECK_SECONDS = 20.0
+
+
+def finished_status(event: dict, task_id: str) -> Optional[str]:
+    """The final status carried by an EventService event for this task, if any"""
+    data = jsonlib.loads(event["data"])
+    if data.get("task_id") == task_id and data.get("status") in FINISHED_TASK_STATUSES:
+        return data["status"]
+    return None
+
+
+def task_etag(task: Task) -> str:
+    """Weak ETag for a task; changes whenever the task row is updated"""
+    return f'W/"{task.status.value}-{task.updated_at.timestamp()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value covers the given ETag"""
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+async def get_owned_task(db: AsyncSession, task_id: UUID, user_id: UUID, *, lock: bool = False) -> Task:
+    """
+    Load one of the user's tasks or raise 404.
+    With lock=True the row is selected FOR UPDATE, so concurrent requests that
+    change the task (two approvals, say) run one after the other and the second
+    sees the first one's status.
+    """
+    query = select(Task).where(Task.id == task_id, Task.created_by == user_id)
+    if lock:
+        query = query.with_for_update()
+    result = await db.execute(query)
+    task = result.scalar_one_or_none()
+    
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Task {task_id} not found"
+        )
+    return task
+
 
 @router.post("", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
 async def create_task(
@@ -100,30 +160,105 @@ async def list_tasks(
     query = query.order_by(Task.created_at.desc()).limit(limit).offset(offset)
     
     result = await db.execute(query)
-    tasks = result.scalars().all()
-    
-    return [TaskResponse.model_validate(task) for task in tasks]
+    return TASK_LIST_ADAPTER.validate_python(result.scalars().all())
 
 
 @router.get("/{task_id}", response_model=TaskResponse)
 async def get_task(
     task_id: UUID,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
-    """Get a specific task by ID"""
-    result = await db.execute(
-        select(Task).where(Task.id == task_id, Task.created_by == current_user.id)
-    )
-    task = result.scalar_one_or_none()
+    """
+    Get a specific task by ID.
+    Responses carry an ETag; pollers that send it back in If-None-Match get
+    an empty 304 until the task changes.
+    """
+    task = await get_owned_task(db, task_id, current_user.id)
     
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Task {task_id} not found"
+    etag = task_etag(task)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return TaskResponse.model_validate(task)
+
+
+@router.websocket("/{task_id}/events")
+async def task_events(
+    websocket: WebSocket,
+    task_id: UUID,
+    token: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Wait for a task to finish without polling GET /tasks/{task_id}.
+    Sends {"task_id", "status"} once the task is completed, failed or
+    cancelled, then closes. Authenticate with an "Authorization: Bearer"
+    header or a `token` query parameter (browsers can't set WebSocket headers).
+    """
+    authorization = websocket.headers.get("authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    try:
+        user = await authenticate_token(db, token or "")
+    except AuthenticationError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    task_id_str = str(task_id)
+    
+    async def read_status() -> Optional[str]:
+        result = await db.execute(
+            select(Task.status).where(Task.id == task_id, Task.created_by == user.id)
         )
+        task_status = result.scalar_one_or_none()
+        await db.close()  # Don't hold a pooled connection while waiting
+        return None if task_status is None else task_status.value
     
-    return TaskResponse.model_validate(task)
+    # Subscribe before reading the status so a transition in between isn't missed
+    queue = event_service.subscribe(user.id)
+    try:
+        task_status = await read_status()
+        if task_status is None:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        
+        await websocket.accept()
+        final_status = task_status if task_status in FINISHED_TASK_STATUSES else None
+        if final_status is None:
+            # Stop waiting if the client goes away first
+            disconnected = asyncio.ensure_future(websocket.receive())
+            try:
+                while final_status is None:
+                    next_event = asyncio.ensure_future(queue.get())
+                    await asyncio.wait(
+                        {next_event, disconnected},
+                        timeout=TASK_EVENTS_RECHECK_SECONDS,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    if next_event.done():
+                        final_status = finished_status(next_event.result(), task_id_str)
+                        continue
+                    next_event.cancel()
+                    if disconnected.done():
+                        return
+                    
+                    # Quiet for a while: the final event may have been lost, so ask the row
+                    task_status = await read_status()
+                    if task_status is None:  # Deleted while we waited
+                        await websocket.close()
+                        return
+                    if task_status in FINISHED_TASK_STATUSES:
+                        final_status = task_status
+            finally:
+                disconnected.cancel()
+        
+        await websocket.send_json({"task_id": task_id_str, "status": final_status})
+        await websocket.close()
+    finally:
+        event_service.unsubscribe(user.id, queue)
 
 
 @router.post("/{task_id}/approve", response_model=TaskResponse)
@@ -134,16 +269,7 @@ async def approve_task(
     db: AsyncSession = Depends(get_db),
 ):
     """Approve a task (changes status from PENDING to IN_PROGRESS)"""
-    result = await db.execute(
-        select(Task).where(Task.id == task_id, Task.created_by == current_user.id)
-    )
-    task = result.scalar_one_or_none()
-    
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Task {task_id} not found"
-        )
+    task = await get_owned_task(db, task_id, current_user.id, lock=True)
     
     if task.status != TaskStatus.PENDING:
         raise HTTPException(
@@ -154,16 +280,16 @@ async def approve_task(
     task.status = TaskStatus.IN_PROGRESS
     task.started_at = datetime.utcnow()
     
-    # Store approval notes in result metadata
+    # Store approval notes in result metadata (a new dict, so the JSON column is marked changed)
     if notes:
-        if task.result is None:
-            task.result = {}
-        task.result["approval_notes"] = notes
-        task.result["approved_by"] = str(current_user.id)
-        task.result["approved_at"] = datetime.utcnow().isoformat()
+        task.result = {
+            **(task.result or {}),
+            "approval_notes": notes,
+            "approved_by": str(current_user.id),
+            "approved_at": datetime.utcnow().isoformat(),
+        }
     
-    await db.commit()
-    await db.refresh(task)
+    await db.commit()  # updated_at comes back via RETURNING (eager_defaults), no refresh needed
     
     logger.info("Task approved", task_id=str(task.id), user_id=str(current_user.id))
     return TaskResponse.model_validate(task)
@@ -178,16 +304,7 @@ async def verify_task(
     db: AsyncSession = Depends(get_db),
 ):
     """Verify task completion (marks as COMPLETED or FAILED)"""
-    result = await db.execute(
-        select(Task).where(Task.id == task_id, Task.created_by == current_user.id)
-    )
-    task = result.scalar_one_or_none()
-    
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Task {task_id} not found"
-        )
+    task = await get_owned_task(db, task_id, current_user.id, lock=True)
     
     if task.status not in [TaskStatus.IN_PROGRESS, TaskStatus.PENDING]:
         raise HTTPException(
@@ -206,14 +323,20 @@ async def verify_task(
     
     # Store verification notes
     if notes:
-        if task.result is None:
-            task.result = {}
-        task.result["verification_notes"] = notes
-        task.result["verified_by"] = str(current_user.id)
-        task.result["verified_at"] = datetime.utcnow().isoformat()
+        task.result = {
+            **(task.result or {}),
+            "verification_notes": notes,
+            "verified_by": str(current_user.id),
+            "verified_at": datetime.utcnow().isoformat(),
+        }
     
     await db.commit()
-    await db.refresh(task)
+    
+    await event_service.publish(
+        current_user.id,
+        "status_changed",
+        {"task_id": str(task.id), "status": task.status.value},
+    )
     
     logger.info("Task verified", task_id=str(task.id), verified=verified, user_id=str(current_user.id))
     return TaskResponse.model_validate(task)
@@ -226,16 +349,7 @@ async def delete_task(
     db: AsyncSession = Depends(get_db),
 ):
     """Delete a task (only if PENDING or FAILED)"""
-    result = await db.execute(
-        select(Task).where(Task.id == task_id, Task.created_by == current_user.id)
-    )
-    task = result.scalar_one_or_none()
-    
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Task {task_id} not found"
-        )
+    task = await get_owned_task(db, task_id, current_user.id, lock=True)
     
     if task.status in [TaskStatus.IN_PROGRESS, TaskStatus.COMPLETED]:
         raise HTTPException(
@@ -246,6 +360,5 @@ async def delete_task(
     await db.delete(task)
     await db.commit()
     
+    logger.info("Task deleted", task_id=str(task_id), user_id=str(current_user.id))
     return None
-    
-    logger.info("Task deleted", task_id=str(task.id), user_id=str(current_user.id))
@@ -1,8 +1,9 @@
 """
 Application configuration using pydantic-settings
 """
+from functools import cached_property
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List, Optional
+from typing import Optional, Tuple
 
 
 class Settings(BaseSettings):
@@ -32,15 +33,24 @@ class Settings(BaseSettings):
     API_V1_PREFIX: str = "/api/v1"
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:3001"
     
-    @property
-    def cors_origins_list(self) -> List[str]:
-        """Parse CORS_ORIGINS string into list"""
-        return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
+    @cached_property
+    def cors_origins_list(self) -> Tuple[str, ...]:
+        """Parse CORS_ORIGINS once; a tuple, so callers can't alter the shared value"""
+        return tuple(origin.strip() for origin in self.CORS_ORIGINS.split(","))
     
     # Security
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Argon2id parameters for new password hashes (memory cost is in KiB)
+    ARGON2_TIME_COST: int = 2
+    ARGON2_MEMORY_COST: int = 65536
+    ARGON2_PARALLELISM: int = 2
+    # Supabase users cached per access token for /auth/me (seconds, capped at the
+    # token lifetime); each entry expires up to JITTER_PCT percent early so
+    # tokens minted together don't all miss at once
+    TOKEN_CACHE_TTL: int = 300
+    TOKEN_CACHE_JITTER_PCT: int = 25
     
     # AI Services
     GROQ_API_KEY: Optional[str] = None
@@ -4,7 +4,7 @@ FastAPI application entry point
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from app.config import settings
 import structlog
 
@@ -56,14 +56,27 @@ async def lifespan(app: FastAPI):
         else:
             logger.warning("Database initialization failed", error=error_msg)
             logger.warning("Tables may need to be created manually. Error will appear on first API call.")
+    from app.services.event_service import event_service
+    event_service.start()
     yield
     # Shutdown
     logger.info("NEXUS is shutting down")
+    await event_service.stop()
     try:
         from app.database import close_db
         await close_db()
     except Exception:
         pass
+    try:
+        from app.utils.http_client import close_http_client
+        await close_http_client()
+    except Exception:
+        pass
+    try:
+        from app.utils.redis_client import close_redis
+        await close_redis()
+    except Exception:
+        pass
 
 
 # Create FastAPI app
@@ -74,11 +87,12 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware
 # Ensure localhost:3000 is always included for frontend
-cors_origins = settings.cors_origins_list
+cors_origins = list(settings.cors_origins_list)
 if "http://localhost:3000" not in cors_origins:
     cors_origins.append("http://localhost:3000")
 app.add_middleware(
@@ -109,7 +123,7 @@ async def global_exception_handler(request: Request, exc: Exception):
     
     if is_db_error:
         logger.error("Database connection error", error=error_msg, path=request.url.path)
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             content={
                 "detail": "Database connection failed. Please check your DATABASE_URL in .env file and ensure the database is accessible."
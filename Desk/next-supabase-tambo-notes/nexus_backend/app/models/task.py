@@ -30,6 +30,8 @@ class TaskPriority(str, enum.Enum):
 class Task(Base):
     """Task model for command execution"""
     __tablename__ = "tasks"
+    # Fetch server-generated timestamps with RETURNING on insert/update instead of a refresh
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
     title = Column(String(255), nullable=False)
@@ -1,15 +1,33 @@
 """
 Transaction model
 """
-from sqlalchemy import Column, String, Text, Enum, JSON, DateTime, ForeignKey, Numeric
+from sqlalchemy import CheckConstraint, Column, String, Text, JSON, DateTime, ForeignKey, Index, Numeric
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from sqlalchemy.sql.functions import FunctionElement
 from app.database import Base
-import uuid
 import enum
 
 
+class GenRandomUUID(FunctionElement):
+    """Server-side UUID default: gen_random_uuid() on Postgres (13+, no pgcrypto needed)"""
+    name = "gen_random_uuid"
+    inherit_cache = True
+
+
+@compiles(GenRandomUUID)
+def _compile_gen_random_uuid(element, compiler, **kw):
+    return "gen_random_uuid()"
+
+
+@compiles(GenRandomUUID, "sqlite")
+def _compile_gen_random_uuid_sqlite(element, compiler, **kw):
+    # Random 32-char hex, the CHAR(32) form SQLAlchemy uses for UUIDs on SQLite (tests)
+    return "lower(hex(randomblob(16)))"
+
+
 class TransactionType(str, enum.Enum):
     """Transaction type enumeration"""
     COMMAND = "command"
@@ -27,20 +45,40 @@ class TransactionStatus(str, enum.Enum):
     ROLLED_BACK = "rolled_back"
 
 
+def _in_values(column: str, enum_class: type) -> str:
+    """SQL CHECK expression restricting a column to an enum's values"""
+    values = ", ".join(f"'{member.value}'" for member in enum_class)
+    return f"{column} IN ({values})"
+
+
 class Transaction(Base):
     """Transaction model for audit and rollback"""
     __tablename__ = "transactions"
+    # The id and timestamps come back via RETURNING in the INSERT itself
+    __mapper_args__ = {"eager_defaults": True}
+    # Plain VARCHARs with CHECKs instead of native enum types: smaller indexes and no
+    # ALTER TYPE migrations; the Python enums are still used by the service layer
+    __table_args__ = (
+        CheckConstraint(_in_values("transaction_type", TransactionType), name="ck_transactions_type"),
+        CheckConstraint(_in_values("status", TransactionStatus), name="ck_transactions_status"),
+        # Per-user time-window queries (spending summaries, history); cost is included so
+        # the budget SUM can be answered from the index alone
+        Index("ix_tx_user_time", "created_by", "created_at"),
+        Index("ix_tx_user_status_time", "created_by", "status", "created_at", postgresql_include=["cost"]),
+        Index("ix_tx_status_time", "status", "created_at"),
+    )
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    transaction_type = Column(Enum(TransactionType), nullable=False, index=True)
-    status = Column(Enum(TransactionStatus), default=TransactionStatus.PENDING, nullable=False, index=True)
+    # Generated by the database, so inserts don't build UUIDs in Python
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=GenRandomUUID(), index=True)
+    transaction_type = Column(String(16), nullable=False, index=True)
+    status = Column(String(16), default=TransactionStatus.PENDING.value, nullable=False)  # Indexed via ix_tx_status_time
     task_id = Column(UUID(as_uuid=True), ForeignKey("tasks.id"), nullable=True, index=True)
     request_data = Column(JSON, nullable=True)  # Original request data
     response_data = Column(JSON, nullable=True)  # Response data
     error_data = Column(JSON, nullable=True)  # Error details if failed
     cost = Column(Numeric(10, 2), nullable=True)  # Transaction cost (if applicable)
     extra_metadata = Column(JSON, nullable=True)  # Additional metadata (renamed from 'metadata' to avoid SQLAlchemy conflict)
-    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)  # Indexed via ix_tx_user_time
     started_at = Column(DateTime(timezone=True), nullable=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
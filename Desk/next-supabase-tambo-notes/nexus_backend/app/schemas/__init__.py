@@ -1,8 +1,14 @@
 """
 Pydantic schemas for NEXUS API
 """
-from app.schemas.user import UserCreate, UserUpdate, UserResponse
-from app.schemas.agent import AgentCreate, AgentUpdate, AgentResponse
+from app.schemas.user import UserCreate, UserUpdate, UserResponse, TokenBundleResponse
+from app.schemas.agent import (
+    AgentCreate,
+    AgentUpdate,
+    AgentResponse,
+    ActiveAgentResponse,
+    ActiveAgentListResponse,
+)
 from app.schemas.task import TaskCreate, TaskUpdate, TaskResponse
 from app.schemas.transaction import TransactionCreate, TransactionResponse
 from app.schemas.audit_log import AuditLogResponse
@@ -13,10 +19,13 @@ __all__ = [
     "UserCreate",
     "UserUpdate",
     "UserResponse",
+    "TokenBundleResponse",
     # Agent
     "AgentCreate",
     "AgentUpdate",
     "AgentResponse",
+    "ActiveAgentResponse",
+    "ActiveAgentListResponse",
     # Task
     "TaskCreate",
     "TaskUpdate",
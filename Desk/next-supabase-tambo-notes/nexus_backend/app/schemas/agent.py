@@ -38,3 +38,22 @@ class AgentResponse(AgentBase):
     updated_at: datetime
 
     model_config = {"from_attributes": True}
+
+
+class ActiveAgentResponse(BaseModel):
+    """Schema for an active agent with its task count"""
+    id: UUID
+    name: str
+    agent_type: AgentType
+    status: AgentStatus
+    capabilities: Optional[List[str]] = None
+    task_count: int = 0
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class ActiveAgentListResponse(BaseModel):
+    """Schema for the active agents listing"""
+    agents: List[ActiveAgentResponse]
+    count: int
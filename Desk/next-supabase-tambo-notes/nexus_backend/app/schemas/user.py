@@ -41,3 +41,11 @@ class UserResponse(UserBase):
     updated_at: datetime
 
     model_config = {"from_attributes": True}
+
+
+class TokenBundleResponse(BaseModel):
+    """Schema for register/login responses: the user plus their tokens"""
+    user: UserResponse
+    access_token: str
+    refresh_token: Optional[str] = None
+    token_type: str = "bearer"
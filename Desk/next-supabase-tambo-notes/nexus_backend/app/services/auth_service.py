@@ -2,81 +2,248 @@
 Authentication service with JWT and password hashing
 """
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import Dict, List, Optional
+from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.config import settings
 from app.models.user import User
 from app.exceptions import AuthenticationError, NotFoundError
+from app.utils.cache import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+from jwt.algorithms import HMACAlgorithm
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+import asyncio
+import bcrypt
+import hashlib
+import hmac
+import jwt
+import os
 import structlog
+import time
 
 logger = structlog.get_logger()
 
-# Password hashing context
-# Note: bcrypt has a 72-byte limit on passwords
-pwd_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto",
+# Legacy bcrypt hashes are still accepted; bcrypt only uses the first 72 bytes
+BCRYPT_HASH_PREFIXES = ("$2a$", "$2b$", "$2y$")
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+_password_hasher = PasswordHasher(
+    time_cost=settings.ARGON2_TIME_COST,
+    memory_cost=settings.ARGON2_MEMORY_COST,
+    parallelism=settings.ARGON2_PARALLELISM,
 )
 
+# Password hashing releases the GIL, so it runs in parallel on its own pool
+# without starving the default executor used for other blocking calls
+_password_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="password")
+
+TOKEN_CACHE_TTL_SECONDS = 60
+
+# Verified JWT payloads keyed by a digest of the raw token
+_token_cache = TTLCache(ttl=TOKEN_CACHE_TTL_SECONDS, maxsize=10_000)
+
+USER_ID_CACHE_TTL_SECONDS = 30
+
+# email -> user id; users are then loaded by primary key, so the row itself
+# (is_active, password hash) is never stale
+_user_id_cache = TTLCache(ttl=USER_ID_CACHE_TTL_SECONDS, maxsize=10_000)
+
+CURRENT_USER_CACHE_TTL_SECONDS = 30
+
+# user id -> active User resolved for an access token; short-lived so a
+# deactivation takes effect within the TTL even without invalidation
+_current_user_cache = TTLCache(ttl=CURRENT_USER_CACHE_TTL_SECONDS, maxsize=10_000)
+
+
+
+class PrecomputedHMACAlgorithm(HMACAlgorithm):
+    """
+    HMAC JWT algorithm that keys the MAC with our SECRET_KEY once and copies
+    that state per token, instead of re-deriving the key pads on every
+    sign/verify. Other keys fall back to the stock implementation.
+    """
+
+    def __init__(self, hash_alg, secret: str):
+        super().__init__(hash_alg)
+        self._secret = secret
+        self._secret_bytes = secret.encode("utf-8")
+        self._keyed_mac = hmac.new(self._secret_bytes, digestmod=hash_alg)
+
+    def prepare_key(self, key):
+        if key == self._secret:
+            return self._secret_bytes
+        return super().prepare_key(key)
+
+    def sign(self, msg: bytes, key: bytes) -> bytes:
+        if key == self._secret_bytes:
+            mac = self._keyed_mac.copy()
+            mac.update(msg)
+            return mac.digest()
+        return super().sign(msg, key)
+
+
+_HMAC_HASHES = {
+    "HS256": HMACAlgorithm.SHA256,
+    "HS384": HMACAlgorithm.SHA384,
+    "HS512": HMACAlgorithm.SHA512,
+}
+if settings.ALGORITHM in _HMAC_HASHES:
+    jwt.unregister_algorithm(settings.ALGORITHM)
+    jwt.register_algorithm(
+        settings.ALGORITHM,
+        PrecomputedHMACAlgorithm(_HMAC_HASHES[settings.ALGORITHM], settings.SECRET_KEY),
+    )
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Verify a password against its hash (Argon2id, or bcrypt for older accounts)"""
+    if hashed_password.startswith(BCRYPT_HASH_PREFIXES):
+        return bcrypt.checkpw(
+            plain_password.encode("utf-8")[:BCRYPT_MAX_PASSWORD_BYTES],
+            hashed_password.encode("utf-8"),
+        )
+    try:
+        return _password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Whether a hash is bcrypt or uses weaker Argon2 parameters than configured"""
+    if hashed_password.startswith(BCRYPT_HASH_PREFIXES):
+        return True
+    return _password_hasher.check_needs_rehash(hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
+    """Hash a password with Argon2id"""
+    return _password_hasher.hash(password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    
-    to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
+    if not expires_delta:
+        expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    # Claims are built in one dict display rather than copy() + update()
+    to_encode = {**data, "exp": datetime.utcnow() + expires_delta, "type": "access"}
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
 
 def create_refresh_token(data: dict) -> str:
     """Create a JWT refresh token (longer expiry)"""
-    to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=7)  # 7 days for refresh token
-    to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
+    to_encode = {**data, "exp": expire, "type": "refresh"}
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
 
 def decode_token(token: str) -> dict:
-    """Decode and verify a JWT token"""
+    """
+    Decode and verify a JWT token.
+    Verified payloads are cached briefly (never past their own `exp`), so a
+    token presented on every request is only verified once a minute.
+    The returned payload is shared; treat it as read-only.
+    """
+    key = hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+    payload = _token_cache.get(key)
+    if payload is not None and payload.get("exp", 0) > time.time():
+        return payload
+    
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = jwt.decode(
+            token,
+            settings.SECRET_KEY,
+            algorithms=[settings.ALGORITHM],
+            options={"require": ["exp", "type"]},
+        )
+        _token_cache.set(key, payload)  # Only valid tokens are cached
         return payload
-    except JWTError as e:
-        logger.warning("Token decode failed", error=str(e))
+    except jwt.InvalidTokenError as e:
+        logger.debug("Token decode failed", error=str(e))  # Routine for expired tokens and scanners
         raise AuthenticationError("Invalid token")
 
 
+async def decode_token_async(token: str) -> dict:
+    """
+    decode_token() for async callers. HMAC verification takes microseconds
+    and runs inline; RSA/EC signatures (if ALGORITHM is switched to one) are
+    verified in a worker thread so they can't stall the event loop.
+    """
+    if settings.ALGORITHM in _HMAC_HASHES:
+        return decode_token(token)
+    return await asyncio.get_running_loop().run_in_executor(None, decode_token, token)
+
+
+def verify_token_batch(tokens: List[str]) -> Dict[str, Optional[dict]]:
+    """
+    Verify many tokens at once, e.g. when re-checking SSE subscribers before
+    a broadcast. Duplicates (one user with several tabs open) are verified
+    only once. Maps each token to its payload, or None if it is invalid.
+    """
+    results: Dict[str, Optional[dict]] = dict.fromkeys(tokens)
+    for token in results:
+        try:
+            results[token] = decode_token(token)
+        except AuthenticationError:
+            pass
+    return results
+
+
 async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
-    """Get a user by email"""
+    """
+    Get a user by email.
+    A recently seen email resolves through its cached id with db.get(),
+    which is served from the session's identity map when possible.
+    """
+    user_id = _user_id_cache.get(email)
+    if user_id is not None:
+        user = await db.get(User, user_id)
+        if user is not None and user.email == email:
+            return user
+        _user_id_cache.pop(email)
+    
     result = await db.execute(select(User).where(User.email == email))
-    return result.scalar_one_or_none()
+    user = result.scalar_one_or_none()
+    if user is not None:
+        _user_id_cache.set(email, user.id)  # Misses aren't cached, so sign-ups are seen at once
+    return user
+
+
+def invalidate_user_cache(email: Optional[str] = None, user_id: Optional[UUID] = None) -> None:
+    """
+    Forget cached lookups for a user; call whenever a user's email or
+    active status changes, the user is deleted, or their tokens are revoked.
+    """
+    if email is not None:
+        _user_id_cache.pop(email)
+    if user_id is not None:
+        _current_user_cache.pop(user_id)
 
 
-async def get_user_by_id(db: AsyncSession, user_id: str) -> Optional[User]:
+async def get_user_by_id(db: AsyncSession, user_id: UUID) -> Optional[User]:
     """Get a user by ID"""
-    from uuid import UUID
-    result = await db.execute(select(User).where(User.id == UUID(user_id)))
+    result = await db.execute(select(User).where(User.id == user_id))
     return result.scalar_one_or_none()
 
 
+async def get_active_user(db: AsyncSession, user_id: UUID) -> Optional[User]:
+    """
+    Get an active user by ID for request authentication.
+    Results are cached briefly across requests, so the returned User may be
+    detached from `db`: treat it as read-only and don't lazy-load relationships.
+    """
+    user = _current_user_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    user = await get_user_by_id(db, user_id)
+    if user is None or not user.is_active:
+        return None
+    _current_user_cache.set(user_id, user)
+    return user
+
+
 async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
     """Authenticate a user with email and password"""
     user = await get_user_by_email(db, email)
@@ -84,10 +251,16 @@ async def authenticate_user(db: AsyncSession, email: str, password: str) -> Opti
         return None
     if not user.hashed_password:
         return None  # OAuth users don't have passwords
-    if not verify_password(password, user.hashed_password):
+    # Hashing takes tens of milliseconds; keep it off the event loop
+    loop = asyncio.get_running_loop()
+    if not await loop.run_in_executor(_password_executor, verify_password, password, user.hashed_password):
         return None
     if not user.is_active:
         return None
+    if password_needs_rehash(user.hashed_password):
+        # Upgrade bcrypt (or outdated Argon2) hashes while we have the plain password;
+        # the request's session commits the change
+        user.hashed_password = await loop.run_in_executor(_password_executor, get_password_hash, password)
     return user
 
 
@@ -100,7 +273,9 @@ async def create_user(db: AsyncSession, email: str, password: str, username: Opt
     if existing_user:
         raise ConflictError(f"User with email {email} already exists")
     
-    hashed_password = get_password_hash(password)
+    hashed_password = await asyncio.get_running_loop().run_in_executor(
+        _password_executor, get_password_hash, password
+    )
     user = User(
         email=email,
         username=username,
@@ -111,5 +286,6 @@ async def create_user(db: AsyncSession, email: str, password: str, username: Opt
     db.add(user)
     await db.commit()
     await db.refresh(user)
+    invalidate_user_cache(email)
     logger.info("User created", user_id=str(user.id), email=email)
     return user
@@ -1,17 +1,61 @@
 """
 Budget Service for tracking and enforcing spending limits
 """
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta, timezone
 from typing import Optional, Dict, Any
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_
 from app.models.transaction import Transaction, TransactionStatus
 from app.config import settings
+from app.utils.redis_client import get_redis
+import redis.asyncio as redis
 import structlog
 
 logger = structlog.get_logger()
 
+SPENDING_CACHE_TTL_SECONDS = 60
+SPENDING_GENERATION_TTL_SECONDS = 24 * 60 * 60
+
+# Bump a user's spending generation and drop their cached totals
+_INVALIDATE_SPENDING = """
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+for i = 2, #KEYS do
+    redis.call('DEL', KEYS[i])
+end
+return true
+"""
+
+# Cache a total only if no spending was recorded since it was read: otherwise
+# a total summed just before a commit could overwrite the invalidation
+_SET_IF_GENERATION = """
+if (redis.call('GET', KEYS[2]) or '') == ARGV[1] then
+    return redis.call('SETEX', KEYS[1], ARGV[2], ARGV[3])
+end
+return false
+"""
+
+
+def utc_today() -> date:
+    """Today's date in UTC, the calendar budget days are counted in"""
+    return datetime.now(timezone.utc).date()
+
+
+def day_start(day: date) -> datetime:
+    """Midnight UTC at the start of a calendar day"""
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def spending_cache_key(user_id: UUID, start_date: date, end_date: date) -> str:
+    """Redis key for a user's cached spending total over a date range"""
+    return f"spending:{user_id}:{start_date.isoformat()}:{end_date.isoformat()}"
+
+
+def spending_generation_key(user_id: UUID) -> str:
+    """Redis key counting spending recorded for a user, guarding cache writes"""
+    return f"spending:{user_id}:generation"
+
 
 class BudgetService:
     """Service for managing budget limits and spending tracking"""
@@ -27,14 +71,15 @@ class BudgetService:
         Check if spending amount is within budget limits.
         Returns (is_allowed, error_message)
         """
+        today = utc_today()
         if period == "daily":
             limit = settings.DAILY_BUDGET_LIMIT
-            start_date = date.today()
-            end_date = start_date
+            start_date = today
+            end_date = today
         elif period == "monthly":
             limit = settings.MONTHLY_BUDGET_LIMIT
-            start_date = date.today().replace(day=1)
-            end_date = date.today()
+            start_date = today.replace(day=1)
+            end_date = today
         else:
             return False, f"Invalid period: {period}"
         
@@ -55,20 +100,44 @@ class BudgetService:
         start_date: date,
         end_date: date
     ) -> float:
-        """Get total spending for a user in a date range"""
+        """
+        Get total spending for a user in a date range.
+        Totals are cached in Redis for a minute and dropped by
+        record_spending(); if Redis is unavailable the database is used.
+        """
+        cache_key = spending_cache_key(user_id, start_date, end_date)
+        generation_key = spending_generation_key(user_id)
+        try:
+            cached, generation = await get_redis().mget(cache_key, generation_key)
+            if cached is not None:
+                return float(cached)
+        except redis.RedisError as e:
+            logger.debug("Spending cache unavailable", error=str(e))
+            cache_key = None  # Without the generation read, the total can't be cached safely
+        
         result = await db.execute(
             select(func.coalesce(func.sum(Transaction.cost), 0))
             .where(
                 and_(
                     Transaction.created_by == user_id,
-                    Transaction.status == TransactionStatus.SUCCESS,
-                    func.date(Transaction.created_at) >= start_date,
-                    func.date(Transaction.created_at) <= end_date,
+                    Transaction.status == TransactionStatus.SUCCESS.value,
+                    # Plain range on created_at (not DATE(created_at)) so ix_tx_user_status_time applies
+                    Transaction.created_at >= day_start(start_date),
+                    Transaction.created_at < day_start(end_date + timedelta(days=1)),
                 )
             )
         )
-        total = result.scalar() or 0.0
-        return float(total)
+        total = float(result.scalar() or 0.0)
+        
+        if cache_key is not None:
+            try:
+                await get_redis().eval(
+                    _SET_IF_GENERATION, 2, cache_key, generation_key,
+                    generation or "", SPENDING_CACHE_TTL_SECONDS, repr(total),
+                )
+            except redis.RedisError:
+                pass
+        return total
     
     @staticmethod
     async def record_spending(
@@ -78,8 +147,24 @@ class BudgetService:
         transaction_id: Optional[UUID] = None,
         metadata: Optional[Dict[str, Any]] = None
     ) -> None:
-        """Record a spending transaction"""
-        # This is handled by Transaction model, but we can add logging here
+        """
+        Record a spending transaction.
+        The Transaction row itself is written by the caller; here the cached
+        daily and monthly totals are dropped so the next read sums them
+        afresh. Call only after a SUCCESS transaction is committed.
+        """
+        today = utc_today()
+        try:
+            await get_redis().eval(
+                _INVALIDATE_SPENDING, 3,
+                spending_generation_key(user_id),
+                spending_cache_key(user_id, today, today),
+                spending_cache_key(user_id, today.replace(day=1), today),
+                SPENDING_GENERATION_TTL_SECONDS,
+            )
+        except redis.RedisError as e:
+            logger.warning("Could not invalidate spending cache", error=str(e), user_id=str(user_id))
+        
         logger.info(
             "Spending recorded",
             user_id=user_id,
@@ -93,11 +178,27 @@ class BudgetService:
         user_id: UUID
     ) -> Dict[str, Any]:
         """Get spending summary for a user"""
-        today = date.today()
+        today = utc_today()
         month_start = today.replace(day=1)
         
-        daily_spending = await BudgetService.get_spending(db, user_id, today, today)
-        monthly_spending = await BudgetService.get_spending(db, user_id, month_start, today)
+        # Both totals in one pass over this month's rows; the daily one is a filtered SUM
+        result = await db.execute(
+            select(
+                func.coalesce(func.sum(Transaction.cost).filter(Transaction.created_at >= day_start(today)), 0),
+                func.coalesce(func.sum(Transaction.cost), 0),
+            )
+            .where(
+                and_(
+                    Transaction.created_by == user_id,
+                    Transaction.status == TransactionStatus.SUCCESS.value,
+                    Transaction.created_at >= day_start(month_start),
+                    Transaction.created_at < day_start(today + timedelta(days=1)),
+                )
+            )
+        )
+        daily_total, monthly_total = result.one()
+        daily_spending = float(daily_total or 0.0)
+        monthly_spending = float(monthly_total or 0.0)
         
         return {
             "daily_spending": daily_spending,
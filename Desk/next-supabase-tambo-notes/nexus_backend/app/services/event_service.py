@@ -1,43 +1,118 @@
 """
 Event Service for real-time event publishing via SSE
 """
-from typing import Dict, Any, Optional, Callable, List
+from typing import Dict, Any, Optional, List
 from uuid import UUID
+from app.utils import jsonlib
+from app.utils.redis_client import get_redis
 import asyncio
-import json
+import redis.asyncio as redis
 import structlog
-from datetime import datetime
+import time
 
 logger = structlog.get_logger()
 
 
+# Events buffered per connection before a slow client starts losing its oldest ones
+SUBSCRIBER_QUEUE_SIZE = 256
+
+# Events in a row a connection may lose before it is cut off as stalled
+MAX_CONSECUTIVE_OVERFLOWS = 256
+
+# Redis pub/sub channels relaying events between workers
+USER_CHANNEL_PREFIX = "events:user:"
+BROADCAST_CHANNEL = "events:broadcast"
+
+# Seconds to wait before resubscribing after the Redis connection drops,
+# doubling on each failed attempt up to the maximum
+RELAY_RETRY_SECONDS = 1.0
+RELAY_MAX_RETRY_SECONDS = 60.0
+
+
+class SubscriberQueue(asyncio.Queue):
+    """
+    Bounded per-connection event queue that evicts its oldest event when full.
+    A consumer that keeps overflowing is marked `overflowed` so its stream can
+    be closed rather than silently missing everything.
+    """
+    
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize=maxsize)
+        self.overflows = 0  # Consecutive pushes that found the queue full
+    
+    @property
+    def overflowed(self) -> bool:
+        return self.overflows >= MAX_CONSECUTIVE_OVERFLOWS
+    
+    def push(self, event: Dict[str, Any]) -> None:
+        """Queue an event without blocking, dropping the oldest one if full"""
+        if self.full():
+            self.get_nowait()
+            self.overflows += 1
+        else:
+            self.overflows = 0
+        self.put_nowait(event)
+
+
 class EventService:
-    """In-memory event service for SSE broadcasting"""
+    """
+    Event service for SSE broadcasting.
+    Each worker keeps its own connections' queues; once start() is called,
+    events are relayed through Redis pub/sub so they reach connections held
+    by any worker. Without Redis, events are delivered within this process.
+    """
+    
+    __slots__ = ("_queues", "_relay", "_relaying")
     
     _instance: Optional['EventService'] = None
-    _subscribers: Dict[str, List[Callable]] = {}  # user_id -> list of callbacks
+    _queues: Dict[str, List[SubscriberQueue]]  # user_id -> one queue per connection
+    _relay: Optional[asyncio.Task]
+    _relaying: bool  # Subscribed to Redis, so published events come back through it
     
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
+            instance = super().__new__(cls)
+            instance._queues = {}
+            instance._relay = None
+            instance._relaying = False
+            cls._instance = instance
         return cls._instance
     
-    def subscribe(self, user_id: UUID, callback: Callable) -> None:
-        """Subscribe a user to events"""
+    def start(self) -> None:
+        """Start relaying events through Redis (called on application startup)"""
+        if self._relay is None:
+            self._relay = asyncio.create_task(self._listen())
+    
+    async def stop(self) -> None:
+        """Stop the Redis relay (called on application shutdown)"""
+        if self._relay is not None:
+            self._relay.cancel()
+            try:
+                await self._relay
+            except asyncio.CancelledError:
+                pass
+            self._relay = None
+        self._relaying = False
+    
+    def subscribe(self, user_id: UUID) -> SubscriberQueue:
+        """
+        Subscribe a user to events; the returned queue receives them.
+        Stop reading once the queue is `overflowed`: it gets no further events.
+        """
         user_id_str = str(user_id)
-        if user_id_str not in self._subscribers:
-            self._subscribers[user_id_str] = []
-        self._subscribers[user_id_str].append(callback)
-        logger.info("User subscribed to events", user_id=user_id_str, subscribers=len(self._subscribers[user_id_str]))
+        queue = SubscriberQueue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._queues.setdefault(user_id_str, []).append(queue)
+        logger.info("User subscribed to events", user_id=user_id_str, subscribers=len(self._queues[user_id_str]))
+        return queue
     
-    def unsubscribe(self, user_id: UUID, callback: Callable) -> None:
+    def unsubscribe(self, user_id: UUID, queue: SubscriberQueue) -> None:
         """Unsubscribe a user from events"""
         user_id_str = str(user_id)
-        if user_id_str in self._subscribers:
+        if user_id_str in self._queues:
             try:
-                self._subscribers[user_id_str].remove(callback)
-                if not self._subscribers[user_id_str]:
-                    del self._subscribers[user_id_str]
+                self._queues[user_id_str].remove(queue)
+                if not self._queues[user_id_str]:
+                    del self._queues[user_id_str]
                 logger.info("User unsubscribed from events", user_id=user_id_str)
             except ValueError:
                 pass
@@ -59,22 +134,9 @@ class EventService:
             event_id: Optional event ID for SSE
         """
         user_id_str = str(user_id)
-        
-        event = {
-            "id": event_id or f"{int(datetime.utcnow().timestamp() * 1000)}",
-            "type": event_type,
-            "data": json.dumps(data),
-            "timestamp": datetime.utcnow().isoformat(),
-        }
-        
-        if user_id_str in self._subscribers:
-            # Send to all subscribers for this user
-            for callback in self._subscribers[user_id_str]:
-                try:
-                    await callback(event)
-                except Exception as e:
-                    logger.error("Error sending event to subscriber", error=str(e), user_id=user_id_str)
-        
+        event = self._build_event(event_type, data, event_id)
+        if not await self._relay_event(USER_CHANNEL_PREFIX + user_id_str, event):
+            self._deliver(user_id_str, event)
         logger.debug("Event published", user_id=user_id_str, event_type=event_type)
     
     async def publish_broadcast(
@@ -84,15 +146,120 @@ class EventService:
         event_id: Optional[str] = None
     ) -> None:
         """Broadcast event to all subscribers"""
-        for user_id_str in list(self._subscribers.keys()):
-            user_id = UUID(user_id_str)
-            await self.publish(user_id, event_type, data, event_id)
+        # Serialized once; every recipient shares the same event dict
+        event = self._build_event(event_type, data, event_id)
+        if not await self._relay_event(BROADCAST_CHANNEL, event):
+            self._deliver_all(event)
+        logger.debug("Event broadcast", event_type=event_type, users=len(self._queues))
+    
+    @staticmethod
+    def _build_event(event_type: str, data: Dict[str, Any], event_id: Optional[str]) -> Dict[str, Any]:
+        """Build an event from a freshly published payload"""
+        now_ms = time.time_ns() // 1_000_000
+        return EventService._make_event(event_id or str(now_ms), event_type, jsonlib.dumps(data), now_ms)
+    
+    @staticmethod
+    def _make_event(event_id: str, event_type: str, payload: str, timestamp: int) -> Dict[str, Any]:
+        """
+        Assemble the event dict; its contents must not be mutated afterwards.
+        "sse" holds the complete, encoded SSE frame, built once and written
+        as is to every subscribed stream.
+        """
+        return {
+            "id": event_id,
+            "type": event_type,
+            "data": payload,
+            "timestamp": timestamp,  # Epoch milliseconds
+            "sse": f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode("utf-8"),
+        }
+    
+    async def _relay_event(self, channel: str, event: Dict[str, Any]) -> bool:
+        """
+        Publish an event to Redis for every worker's listener to deliver.
+        Returns False if it wasn't relayed and must be delivered locally.
+        """
+        if not self._relaying:
+            return False
+        message = jsonlib.dumps({key: event[key] for key in ("id", "type", "data", "timestamp")})
+        try:
+            await get_redis().publish(channel, message)
+            return True
+        except redis.RedisError as e:
+            logger.warning("Event relay failed, delivering locally", channel=channel, error=str(e))
+            return False
+    
+    async def _listen(self) -> None:
+        """
+        Deliver events relayed through Redis to this worker's connections.
+        One subscription per worker covers every user, however many streams
+        are open; publishers never wait on slow SSE clients.
+        """
+        retry_seconds = RELAY_RETRY_SECONDS
+        outage = False
+        while True:
+            try:
+                async with get_redis().pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.psubscribe(USER_CHANNEL_PREFIX + "*")
+                    await pubsub.subscribe(BROADCAST_CHANNEL)
+                    self._relaying = True
+                    retry_seconds = RELAY_RETRY_SECONDS
+                    outage = False
+                    logger.info("Relaying events through Redis")
+                    while True:
+                        # An explicit timeout returns None when idle instead of
+                        # tripping the client's short socket timeout
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=30.0)
+                        if message is not None:
+                            self._receive(message)
+            except Exception as e:  # Anything but cancellation: keep the relay alive
+                # Logged once per outage, so a deployment without Redis isn't flooded
+                if not outage:
+                    logger.warning("Event relay unavailable, delivering locally", error=str(e))
+                    outage = True
+            finally:
+                self._relaying = False
+            
+            await asyncio.sleep(retry_seconds)
+            retry_seconds = min(retry_seconds * 2, RELAY_MAX_RETRY_SECONDS)
+    
+    def _receive(self, message: Dict[str, Any]) -> None:
+        """Deliver one pub/sub message to the local connections it targets"""
+        try:
+            fields = jsonlib.loads(message["data"])
+            event = self._make_event(fields["id"], fields["type"], fields["data"], fields["timestamp"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed relayed event", channel=message.get("channel"))
+            return
+        
+        channel = message["channel"]
+        if channel == BROADCAST_CHANNEL:
+            self._deliver_all(event)
+        else:
+            self._deliver(channel[len(USER_CHANNEL_PREFIX):], event)
+    
+    def _deliver_all(self, event: Dict[str, Any]) -> None:
+        """Queue an event on every local connection"""
+        for user_id_str in list(self._queues.keys()):
+            self._deliver(user_id_str, event)
+    
+    def _deliver(self, user_id_str: str, event: Dict[str, Any]) -> None:
+        """Queue an event on each of a user's connections"""
+        # Hand the event to every connection without awaiting any of them, so
+        # one slow client can't hold up the rest
+        queues = self._queues.get(user_id_str, ())
+        for queue in queues:
+            queue.push(event)
+        
+        stalled = [queue for queue in queues if queue.overflowed]
+        for queue in stalled:
+            logger.warning("Subscriber fell too far behind, dropping connection", user_id=user_id_str)
+            self.unsubscribe(user_id_str, queue)
     
     def get_subscriber_count(self, user_id: Optional[UUID] = None) -> int:
         """Get number of subscribers (for a user or total)"""
         if user_id:
-            return len(self._subscribers.get(str(user_id), []))
-        return sum(len(callbacks) for callbacks in self._subscribers.values())
+            return len(self._queues.get(str(user_id), []))
+        return sum(len(queues) for queues in self._queues.values())
 
 
 # Global instance
@@ -4,8 +4,9 @@ Intent Parser service using Groq (primary) and Gemini (fallback)
 from typing import Optional, Dict, Any
 from app.schemas.intent import IntentResult, IntentRequest
 from app.config import settings
+from app.utils import jsonlib
 import httpx
-import json
+import re
 import structlog
 
 logger = structlog.get_logger()
@@ -18,6 +19,21 @@ GEMINI_API_KEY = getattr(settings, "GEMINI_API_KEY", None)
 GROQ_MODEL = "llama-3.1-70b-versatile"
 GEMINI_MODEL = "gemini-1.5-flash"
 
+SPENDING_KEYWORDS = ("pay", "cost", "buy", "purchase", "spend", "price", "fee", "charge")
+DESTRUCTIVE_KEYWORDS = ("delete", "remove", "destroy", "drop", "kill", "terminate")
+
+# Each keyword list as one case-insensitive alternation, so a message is scanned
+# once per rule; keywords match anywhere in the message ("payment" counts as "pay")
+SPENDING_PATTERN = re.compile("|".join(SPENDING_KEYWORDS), re.IGNORECASE)
+DESTRUCTIVE_PATTERN = re.compile("|".join(DESTRUCTIVE_KEYWORDS), re.IGNORECASE)
+
+# A dollar amount, optionally preceded by a quantity that applies when the amount
+# is followed by "each" ("10 servers for $1000 each")
+MONEY_PATTERN = re.compile(
+    r"(?:\b(\d+)\s+[^\d$]*?)?\$\s*(\d[\d,]*(?:\.\d+)?)(\s*each\b)?",
+    re.IGNORECASE,
+)
+
 
 async def parse_intent_groq(user_message: str, context: Optional[Dict[str, Any]] = None) -> IntentResult:
     """Parse intent using Groq API"""
@@ -47,7 +63,7 @@ Return ONLY valid JSON matching this schema:
   "risk_level": "low|medium|high|critical or null"
 }"""
 
-    user_prompt = f"User message: {user_message}\n\nContext: {json.dumps(context or {})}"
+    user_prompt = f"User message: {user_message}\n\nContext: {jsonlib.dumps(context or {})}"
 
     async with httpx.AsyncClient(timeout=30.0) as client:
         response = await client.post(
@@ -67,13 +83,11 @@ Return ONLY valid JSON matching this schema:
             },
         )
         response.raise_for_status()
-        data = response.json()
+        data = jsonlib.loads(response.content)
         
         content = data["choices"][0]["message"]["content"]
-        # Parse JSON response
-        intent_data = json.loads(content)
-        
-        return IntentResult(**intent_data)
+        # Parse and validate in one pass (pydantic-core), no intermediate dict
+        return IntentResult.model_validate_json(content)
 
 
 async def parse_intent_gemini(user_message: str, context: Optional[Dict[str, Any]] = None) -> IntentResult:
@@ -96,7 +110,7 @@ Return ONLY valid JSON matching this schema:
   "risk_level": "low|medium|high|critical or null"
 }"""
 
-    prompt = f"{system_prompt}\n\nUser message: {user_message}\n\nContext: {json.dumps(context or {})}\n\nReturn JSON only:"
+    prompt = f"{system_prompt}\n\nUser message: {user_message}\n\nContext: {jsonlib.dumps(context or {})}\n\nReturn JSON only:"
 
     async with httpx.AsyncClient(timeout=30.0) as client:
         response = await client.post(
@@ -113,21 +127,13 @@ Return ONLY valid JSON matching this schema:
             },
         )
         response.raise_for_status()
-        data = response.json()
+        data = jsonlib.loads(response.content)
         
         content = data["candidates"][0]["content"]["parts"][0]["text"]
         # Clean up JSON if needed (remove markdown code blocks)
-        content = content.strip()
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-        content = content.strip()
+        content = content.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
         
-        intent_data = json.loads(content)
-        return IntentResult(**intent_data)
+        return IntentResult.model_validate_json(content)
 
 
 async def parse_intent(request: IntentRequest) -> IntentResult:
@@ -171,6 +177,17 @@ async def parse_intent(request: IntentRequest) -> IntentResult:
             )
 
 
+def extract_amount(user_message: str) -> Optional[float]:
+    """Total of the dollar amounts mentioned in a message, or None if there are none"""
+    total = None
+    for quantity, amount, each in MONEY_PATTERN.findall(user_message):
+        value = float(amount.replace(",", ""))
+        if quantity and each:
+            value *= int(quantity)
+        total = (total or 0.0) + value
+    return total
+
+
 def apply_business_rules(result: IntentResult, user_message: str) -> IntentResult:
     """Apply business rules to intent result"""
     # Rule 1: Low confidence requires clarification
@@ -179,6 +196,12 @@ def apply_business_rules(result: IntentResult, user_message: str) -> IntentResul
         # For now, we'll just log it - the API can handle this
         logger.warning("Low confidence intent", confidence=result.confidence, intent=result.intent)
     
+    # Amounts stated in the message count as the cost when the model gave none
+    if not result.estimated_cost:
+        amount = extract_amount(user_message)
+        if amount:
+            result.estimated_cost = amount
+    
     # Rule 2: Any spending requires approval
     if result.estimated_cost and result.estimated_cost > 0:
         result.requires_approval = True
@@ -186,15 +209,13 @@ def apply_business_rules(result: IntentResult, user_message: str) -> IntentResul
             result.risk_level = "medium"
     
     # Rule 3: Detect spending keywords in message
-    spending_keywords = ["pay", "cost", "buy", "purchase", "spend", "price", "fee", "charge"]
-    if any(keyword in user_message.lower() for keyword in spending_keywords):
+    if SPENDING_PATTERN.search(user_message):
         result.requires_approval = True
         if not result.estimated_cost:
             result.estimated_cost = 0.0  # Unknown cost, but requires approval
     
     # Rule 4: Destructive actions require approval
-    destructive_keywords = ["delete", "remove", "destroy", "drop", "kill", "terminate"]
-    if any(keyword in user_message.lower() for keyword in destructive_keywords):
+    if DESTRUCTIVE_PATTERN.search(user_message):
         result.requires_approval = True
         if not result.risk_level or result.risk_level in ["low", "medium"]:
             result.risk_level = "high"
@@ -5,6 +5,7 @@ Uses Supabase Auth REST API instead of direct database connection
 import httpx
 from typing import Optional, Dict,Any
 from app.config import settings
+from app.utils.http_client import get_http_client
 import structlog
 
 logger = structlog.get_logger()
@@ -126,6 +127,25 @@ class SupabaseAuthService:
             
             return response.json()
 
+    
+    async def sign_out(self, access_token: str) -> None:
+        """
+        Revoke the session behind an access token
+        """
+        response = await get_http_client().post(
+            f"{self.auth_url}/logout",
+            headers={
+                "apikey": self.anon_key,
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json"
+            },
+            timeout=10.0
+        )
+        
+        # 401/404: the session is already gone
+        if response.status_code not in (200, 204, 401, 404):
+            logger.error("Supabase signout failed", status=response.status_code)
+            raise Exception(f"Logout failed: {response.text}")
 
 # Singleton instance
 supabase_auth = SupabaseAuthService()
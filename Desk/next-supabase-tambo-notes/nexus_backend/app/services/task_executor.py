@@ -17,10 +17,26 @@ from app.services.policy_service import PolicyService
 from app.services.event_service import event_service
 from app.agents.registry import registry
 from app.config import settings
+import re
 import structlog
 
 logger = structlog.get_logger()
 
+RESEARCH_KEYWORDS = frozenset({"research", "search", "find", "lookup"})
+COMMUNICATION_KEYWORDS = frozenset({"email", "send", "draft", "communicate", "message"})
+PURCHASE_KEYWORDS = frozenset({"purchase", "buy", "product", "price", "compare"})
+
+# One alternation per agent, checked in priority order; keywords match anywhere in
+# the intent (so "send_email" and "products" count), in a single regex pass each
+INTENT_AGENT_PATTERNS = tuple(
+    (agent_type, re.compile("|".join(sorted(keywords))))
+    for agent_type, keywords in (
+        ("research", RESEARCH_KEYWORDS),
+        ("communication", COMMUNICATION_KEYWORDS),
+        ("purchase", PURCHASE_KEYWORDS),
+    )
+)
+
 
 class TaskExecutor:
     """Executes tasks with intent parsing, approval, and agent execution"""
@@ -45,14 +61,20 @@ class TaskExecutor:
         7. Record Transaction
         8. Write AuditLog entries
         """
+        user_id_str = str(user_id)  # Formatted once; reused for logs and payloads
+        log = logger.bind(user_id=user_id_str)
+        
         # Step 1: Parse intent
-        logger.info("Parsing intent", user_id=str(user_id), message_length=len(user_message))
+        log.info("Parsing intent", message_length=len(user_message))
         intent_request = IntentRequest(user_message=user_message, context=context)
         intent_result = await parse_intent(intent_request)
         
         # Step 2: Create Task DB record
+        task_id = uuid4()
+        task_id_str = str(task_id)
+        log = log.bind(task_id=task_id_str)
         task = Task(
-            id=uuid4(),
+            id=task_id,
             title=f"Task: {intent_result.intent}",
             description=user_message,
             command=intent_result.command,
@@ -70,7 +92,7 @@ class TaskExecutor:
         await db.flush()  # Get task.id
         
         # Audit: Task created
-        await TaskExecutor._log_audit(
+        TaskExecutor._log_audit(
             db, user_id, AuditEventType.TASK_CREATED,
             f"Task {task.id} created", task_id=task.id
         )
@@ -80,7 +102,7 @@ class TaskExecutor:
             user_id,
             "task_created",
             {
-                "task_id": str(task.id),
+                "task_id": task_id_str,
                 "title": task.title,
                 "status": task.status.value,
                 "intent": intent_result.intent,
@@ -97,7 +119,7 @@ class TaskExecutor:
                 task.error_message = error_message
                 await db.commit()
                 
-                await TaskExecutor._log_audit(
+                TaskExecutor._log_audit(
                     db, user_id, AuditEventType.TASK_FAILED,
                     f"Task {task.id} failed: budget exceeded", task_id=task.id
                 )
@@ -105,13 +127,13 @@ class TaskExecutor:
         
         # Step 4: Check/create approval request
         if intent_result.requires_approval:
-            logger.info("Approval required", task_id=str(task.id))
+            log.info("Approval required")
             approval_data = await ApprovalService.create_approval_request(
                 db, task.id, intent_result, user_id
             )
             task.status = TaskStatus.PENDING
             
-            await TaskExecutor._log_audit(
+            TaskExecutor._log_audit(
                 db, user_id, AuditEventType.SECURITY_EVENT,
                 f"Approval requested for task {task.id}", task_id=task.id
             )
@@ -121,7 +143,7 @@ class TaskExecutor:
                 user_id,
                 "approval_needed",
                 {
-                    "task_id": str(task.id),
+                    "task_id": task_id_str,
                     "title": task.title,
                     "risk_level": intent_result.risk_level,
                     "estimated_cost": intent_result.estimated_cost,
@@ -129,16 +151,14 @@ class TaskExecutor:
             )
             
             await db.commit()
-            await db.refresh(task)
             return task  # Task pending approval
         
         # Step 5: Execute agent (no approval needed or auto-approved)
         task.status = TaskStatus.IN_PROGRESS
         task.started_at = datetime.utcnow()
         await db.commit()
-        await db.refresh(task)
         
-        await TaskExecutor._log_audit(
+        TaskExecutor._log_audit(
             db, user_id, AuditEventType.TASK_CREATED,
             f"Task {task.id} started execution", 
             task_id=task.id, ip_address=ip_address, user_agent=user_agent
@@ -149,7 +169,7 @@ class TaskExecutor:
             user_id,
             "status_changed",
             {
-                "task_id": str(task.id),
+                "task_id": task_id_str,
                 "status": task.status.value,
                 "previous_status": "pending",
             }
@@ -160,7 +180,7 @@ class TaskExecutor:
             user_id,
             "agent_started",
             {
-                "task_id": str(task.id),
+                "task_id": task_id_str,
                 "agent_type": agent_type,
             }
         )
@@ -184,7 +204,7 @@ class TaskExecutor:
         
         # Prepare task data for agent
         agent_task = {
-            "id": str(task.id),
+            "id": task_id_str,
             "query": user_message,
             "message": user_message,
             "text": user_message,
@@ -193,36 +213,24 @@ class TaskExecutor:
         }
         
         agent_context = {
-            "user_id": str(user_id),
-            "task_id": str(task.id),
+            "user_id": user_id_str,
+            "task_id": task_id_str,
             "intent": intent_result.intent,
         }
         if context:
             agent_context.update(context)
         
-        # If dependency results exist, include them in agent task
-        if context and "dependency_results" in context:
-            # Include research summary in email draft if available
-            if agent_type == "communication" and "dependency_results" in context:
-                dep_results = context["dependency_results"]
-                # Find research result (usually first dependency with index "0")
-                for dep_key, dep_data in dep_results.items():
-                    if isinstance(dep_data, dict):
-                        # Check for summary in data or result
-                        summary = None
-                        if "summary" in dep_data.get("data", {}):
-                            summary = dep_data["data"]["summary"]
-                        elif "summary" in dep_data:
-                            summary = dep_data["summary"]
-                        
-                        if summary:
-                            agent_task["research_summary"] = summary
-                            agent_task["message"] = f"{user_message}\n\nResearch findings:\n{summary}"
-                            break
+        # Include the research summary from dependencies in email drafts
+        dep_results = (context or {}).get("dependency_results")
+        if agent_type == "communication" and dep_results:
+            summary = TaskExecutor._dependency_summary(dep_results)
+            if summary:
+                agent_task["research_summary"] = summary
+                agent_task["message"] = f"{user_message}\n\nResearch findings:\n{summary}"
         
         # Execute agent
         try:
-            logger.info("Executing agent", agent_type=agent_type, task_id=str(task.id))
+            log.info("Executing agent", agent_type=agent_type)
             agent_result = await agent.run(agent_task, agent_context)
             
             # Step 6: Store result in task
@@ -239,7 +247,7 @@ class TaskExecutor:
                     "execution_time_ms": agent_result.execution_time_ms,
                 })
                 
-                await TaskExecutor._log_audit(
+                TaskExecutor._log_audit(
                     db, user_id, AuditEventType.TASK_COMPLETED,
                     f"Task {task.id} completed successfully", task_id=task.id
                 )
@@ -249,7 +257,7 @@ class TaskExecutor:
                     user_id,
                     "agent_completed",
                     {
-                        "task_id": str(task.id),
+                        "task_id": task_id_str,
                         "agent_type": agent_type,
                         "success": True,
                         "execution_time_ms": agent_result.execution_time_ms,
@@ -261,7 +269,7 @@ class TaskExecutor:
                     user_id,
                     "task_completed",
                     {
-                        "task_id": str(task.id),
+                        "task_id": task_id_str,
                         "status": task.status.value,
                         "success": True,
                     }
@@ -275,7 +283,7 @@ class TaskExecutor:
                 sanitized_error = PolicyService.sanitize_error_message(
                     Exception(agent_result.error), agent_result.error
                 )
-                await TaskExecutor._log_audit(
+                TaskExecutor._log_audit(
                     db, user_id, AuditEventType.TASK_FAILED,
                     f"Task {task.id} failed: {sanitized_error}", 
                     task_id=task.id, ip_address=ip_address, user_agent=user_agent
@@ -286,7 +294,7 @@ class TaskExecutor:
                     user_id,
                     "agent_completed",
                     {
-                        "task_id": str(task.id),
+                        "task_id": task_id_str,
                         "agent_type": agent_type,
                         "success": False,
                         "error": agent_result.error,
@@ -298,7 +306,7 @@ class TaskExecutor:
                     user_id,
                     "status_changed",
                     {
-                        "task_id": str(task.id),
+                        "task_id": task_id_str,
                         "status": task.status.value,
                         "previous_status": "in_progress",
                         "error": agent_result.error,
@@ -306,14 +314,14 @@ class TaskExecutor:
                 )
             
         except Exception as e:
-            logger.error("Agent execution error", error=str(e), task_id=str(task.id), exc_info=True)
+            log.error("Agent execution error", error=str(e), exc_info=True)
             task.status = TaskStatus.FAILED
             # Sanitize error message to prevent leaking sensitive data
             sanitized_error = PolicyService.sanitize_error_message(e, str(e))
             task.error_message = f"Agent execution error: {sanitized_error}"
             task.completed_at = datetime.utcnow()
             
-            await TaskExecutor._log_audit(
+            TaskExecutor._log_audit(
                 db, user_id, AuditEventType.TASK_FAILED,
                 f"Task {task.id} failed with exception: {sanitized_error}", 
                 task_id=task.id, ip_address=ip_address, user_agent=user_agent
@@ -321,9 +329,8 @@ class TaskExecutor:
         
         # Step 7: Record Transaction
         transaction = Transaction(
-            id=uuid4(),
-            transaction_type=TransactionType.COMMAND,
-            status=TransactionStatus.SUCCESS if task.status == TaskStatus.COMPLETED else TransactionStatus.FAILED,
+            transaction_type=TransactionType.COMMAND.value,
+            status=TransactionStatus.SUCCESS.value if task.status == TaskStatus.COMPLETED else TransactionStatus.FAILED.value,
             task_id=task.id,
             request_data={
                 "user_message": user_message,
@@ -337,23 +344,28 @@ class TaskExecutor:
             completed_at=task.completed_at,
         )
         db.add(transaction)
+        await db.flush()  # The id is generated by the database
         
-        # Step 8: Record spending if cost > 0
-        if intent_result.estimated_cost and intent_result.estimated_cost > 0:
-            await BudgetService.record_spending(
-                db, user_id, intent_result.estimated_cost, transaction.id
-            )
-        
-        await db.commit()
-        await db.refresh(task)
-        
-        await TaskExecutor._log_audit(
+        TaskExecutor._log_audit(
             db, user_id, AuditEventType.TRANSACTION_COMPLETED,
             f"Transaction {transaction.id} recorded for task {task.id}",
             task_id=task.id, transaction_id=transaction.id, 
             ip_address=ip_address, user_agent=user_agent
         )
         
+        await db.commit()
+        
+        # Step 8: Record spending if cost > 0; only once committed, and only for
+        # successful transactions, the ones budget totals count
+        if (
+            transaction.status == TransactionStatus.SUCCESS.value
+            and intent_result.estimated_cost
+            and intent_result.estimated_cost > 0
+        ):
+            await BudgetService.record_spending(
+                db, user_id, intent_result.estimated_cost, transaction.id
+            )
+        
         return task
     
     @staticmethod
@@ -362,17 +374,9 @@ class TaskExecutor:
         intent = intent_result.intent.lower()
         command = (intent_result.command or "").lower()
         
-        # Research-related
-        if any(keyword in intent for keyword in ["research", "search", "find", "lookup"]):
-            return "research"
-        
-        # Communication-related
-        if any(keyword in intent for keyword in ["email", "send", "draft", "communicate", "message"]):
-            return "communication"
-        
-        # Purchase/product-related
-        if any(keyword in intent for keyword in ["purchase", "buy", "product", "price", "compare"]):
-            return "purchase"
+        for agent_type, pattern in INTENT_AGENT_PATTERNS:
+            if pattern.search(intent):
+                return agent_type
         
         # Check command
         if "research" in command:
@@ -386,7 +390,18 @@ class TaskExecutor:
         return "research"
     
     @staticmethod
-    async def _log_audit(
+    def _dependency_summary(dep_results: Dict[str, Any]) -> Optional[str]:
+        """First summary among dependency results (usually the research step at index "0")"""
+        for dep_data in dep_results.values():
+            if not isinstance(dep_data, dict):
+                continue
+            summary = (dep_data.get("data") or {}).get("summary") or dep_data.get("summary")
+            if summary:
+                return summary
+        return None
+    
+    @staticmethod
+    def _log_audit(
         db: AsyncSession,
         user_id: UUID,
         event_type: AuditEventType,
@@ -396,7 +411,11 @@ class TaskExecutor:
         ip_address: Optional[str] = None,
         user_agent: Optional[str] = None,
     ) -> None:
-        """Create audit log entry with IP address and user agent"""
+        """
+        Create audit log entry with IP address and user agent.
+        The row is only added to the session: pending audits are written
+        together (one multi-row INSERT) by the next flush or commit.
+        """
         audit_log = AuditLog(
             id=uuid4(),
             event_type=event_type,
@@ -410,4 +429,3 @@ class TaskExecutor:
             created_at=datetime.utcnow(),
         )
         db.add(audit_log)
-        await db.flush()
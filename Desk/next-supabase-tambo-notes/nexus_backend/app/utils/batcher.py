@@ -0,0 +1,71 @@
+"""
+Async micro-batching for outbound API calls
+"""
+from typing import Any, List, Optional, Set, Tuple
+import asyncio
+
+
+class AsyncBatcher:
+    """
+    Collects items passed to `process()` and hands them to `process_batch()`
+    together, once `max_batch_size` items are queued or the oldest item has
+    waited `max_queue_time` seconds. Each caller gets back its own result.
+    Subclasses implement `process_batch()`, returning results in item order;
+    an exception instance in place of a result is raised to that caller alone.
+    """
+
+    def __init__(self, max_batch_size: int = 100, max_queue_time: float = 0.1):
+        self.max_batch_size = max_batch_size
+        self.max_queue_time = max_queue_time
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def process(self, item: Any) -> Any:
+        """Queue an item and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_queue_time, self._flush)
+
+        return await future
+
+    async def process_batch(self, items: List[Any]) -> List[Any]:
+        """Process a batch of items. Must be implemented by subclasses."""
+        raise NotImplementedError
+
+    def _flush(self) -> None:
+        """Start processing everything queued so far"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        """Run one batch and resolve each caller's future"""
+        try:
+            results = await self.process_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
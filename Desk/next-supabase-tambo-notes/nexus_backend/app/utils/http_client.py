@@ -0,0 +1,65 @@
+"""
+Shared httpx client for outbound calls (Groq, Resend, CoinGecko, web search and scraping)
+"""
+from typing import Optional
+import random
+import httpx
+
+try:
+    import h2  # noqa: F401 - enables httpx's HTTP/2 support
+
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - installed via httpx[http2] in requirements.txt
+    HTTP2_AVAILABLE = False
+
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRY_AFTER_SECONDS = 5.0
+
+_HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared AsyncClient, creating it on first use.
+    Reusing one client keeps connections pooled instead of paying a
+    TCP + TLS handshake on every call. Pass `timeout=` per request to override.
+    HTTP/2 is used when h2 is installed, so concurrent calls to one host
+    (Groq, Brave) share a single multiplexed connection.
+    Bodies are requested compressed: httpx sends "Accept-Encoding: gzip, deflate"
+    and adds "br" when the brotli package (in requirements.txt) is installed.
+    """
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None or _HTTP_CLIENT.is_closed:
+        _HTTP_CLIENT = httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0),
+            limits=httpx.Limits(max_keepalive_connections=100, max_connections=1000),
+            http2=HTTP2_AVAILABLE,
+        )
+    return _HTTP_CLIENT
+
+
+async def close_http_client() -> None:
+    """Close the shared AsyncClient (called on application shutdown)"""
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is not None:
+        await _HTTP_CLIENT.aclose()
+        _HTTP_CLIENT = None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed request is worth retrying (network errors, 429 and 5xx)"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+def retry_delay(attempt: int, error: Optional[Exception] = None, base: float = 0.2, cap: float = 2.0) -> float:
+    """
+    Seconds to wait before retry number `attempt` (1-based): exponential
+    backoff with jitter, or the server's Retry-After (capped) on a 429.
+    """
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429:
+        retry_after = error.response.headers.get("retry-after", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), MAX_RETRY_AFTER_SECONDS)
+    return min(cap, base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
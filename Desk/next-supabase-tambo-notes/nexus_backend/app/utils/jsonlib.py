@@ -0,0 +1,35 @@
+"""
+JSON helpers backed by orjson, falling back to the stdlib json module
+"""
+from typing import Any, Union
+
+try:
+    import orjson
+
+    HAS_ORJSON = True
+
+    def loads(data: Union[bytes, bytearray, str]) -> Any:
+        """Parse JSON from bytes or str"""
+        return orjson.loads(data)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """Serialize to compact UTF-8 JSON bytes"""
+        return orjson.dumps(obj)
+
+except ImportError:  # pragma: no cover - orjson is listed in requirements.txt
+    import json
+
+    HAS_ORJSON = False
+
+    def loads(data: Union[bytes, bytearray, str]) -> Any:
+        """Parse JSON from bytes or str"""
+        return json.loads(data)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """Serialize to compact UTF-8 JSON bytes"""
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """Serialize to a compact JSON string"""
+    return dumps_bytes(obj).decode("utf-8")
@@ -0,0 +1,154 @@
+"""
+Streaming helpers for Groq chat completions
+"""
+from typing import Any, Dict, List, Optional
+from app.utils import jsonlib
+from app.utils.cache import SingleFlight, TTLCache
+from app.utils.http_client import get_http_client
+import hashlib
+
+GROQ_CHAT_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_MODEL = "llama-3.1-70b-versatile"
+LLM_CACHE_TTL_SECONDS = 60
+
+# Identical prompts share one in-flight call, and recent results are reused
+_inflight = SingleFlight()
+_response_cache = TTLCache(ttl=LLM_CACHE_TTL_SECONDS, maxsize=256)
+
+
+class JSONObjectScanner:
+    """
+    Accumulates streamed text and detects when the first top-level JSON
+    object is complete, so the caller can stop reading the stream early.
+    Any text before the opening brace (e.g. a markdown fence) is ignored.
+    """
+
+    __slots__ = ("_buffer", "_pos", "_start", "_end", "_depth", "_in_string", "_escape")
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._end: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def complete(self) -> bool:
+        return self._end is not None
+
+    def feed(self, text: str) -> bool:
+        """Add streamed text; returns True once the object has closed"""
+        if self._end is not None:
+            return True
+        self._buffer += text
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+            if self._start is None:
+                if ch == "{":
+                    self._start = i
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._end = i + 1
+                    return True
+        self._pos = len(buffer)
+        return False
+
+    def text(self) -> str:
+        """The JSON object text (or everything received, if it never closed)"""
+        if self._start is None:
+            return self._buffer
+        return self._buffer[self._start:self._end]
+
+
+async def stream_groq_json(
+    api_key: str,
+    messages: List[Dict[str, str]],
+    temperature: float = 0.3,
+    model: str = GROQ_MODEL,
+    timeout: float = 30.0,
+) -> Dict[str, Any]:
+    """
+    Stream a Groq chat completion and parse the JSON object it returns.
+
+    Reading stops as soon as the object's closing brace arrives. Groq's
+    JSON mode (response_format) can't be combined with streaming, so the
+    prompt itself must ask for JSON only.
+    """
+    scanner = JSONObjectScanner()
+    client = get_http_client()
+    async with client.stream(
+        "POST",
+        GROQ_CHAT_URL,
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        },
+        json={
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": True,
+        },
+        timeout=timeout,
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            payload = line[6:]
+            if payload == "[DONE]":
+                break
+            choices = jsonlib.loads(payload).get("choices") or []
+            content = choices[0].get("delta", {}).get("content") if choices else None
+            if content and scanner.feed(content):
+                break
+
+    return jsonlib.loads(scanner.text())
+
+
+def prompt_key(model: str, temperature: float, messages: List[Dict[str, str]]) -> str:
+    """Stable hash of everything that determines a completion"""
+    return hashlib.blake2b(
+        jsonlib.dumps_bytes([model, temperature, messages]), digest_size=16
+    ).hexdigest()
+
+
+async def cached_groq_json(
+    api_key: str,
+    messages: List[Dict[str, str]],
+    temperature: float = 0.3,
+    model: str = GROQ_MODEL,
+    timeout: float = 30.0,
+) -> Dict[str, Any]:
+    """
+    stream_groq_json() with duplicate suppression: concurrent identical
+    prompts wait on a single request, and results are cached briefly.
+    Callers must treat the returned dict as read-only.
+    """
+    key = prompt_key(model, temperature, messages)
+    cached = _response_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = await _inflight.do(
+        key, lambda: stream_groq_json(api_key, messages, temperature, model, timeout)
+    )
+    _response_cache.set(key, result)
+    return result
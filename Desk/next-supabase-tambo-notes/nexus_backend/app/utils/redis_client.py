@@ -0,0 +1,34 @@
+"""
+Shared Redis client for caches that should survive restarts and be shared across workers
+"""
+from typing import Optional
+from app.config import settings
+import redis.asyncio as redis
+
+_REDIS: Optional[redis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Get the shared Redis client, creating it on first use.
+    Connections are pooled and opened lazily, so this never blocks.
+    Redis is a cache here: callers should catch redis.RedisError and fall
+    back to the database rather than fail the request.
+    """
+    global _REDIS
+    if _REDIS is None:
+        _REDIS = redis.Redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5,
+        )
+    return _REDIS
+
+
+async def close_redis() -> None:
+    """Close the shared Redis client (called on application shutdown)"""
+    global _REDIS
+    if _REDIS is not None:
+        await _REDIS.aclose()
+        _REDIS = None
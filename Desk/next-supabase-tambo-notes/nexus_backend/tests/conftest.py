@@ -1,31 +1,6 @@
 """
 Pytest configuration and fixtures
 """
-# Patch passlib's bcrypt bug detection before any imports
-# This prevents the 72-byte password limit error during bcrypt initialization
-try:
-    import passlib.handlers.bcrypt as bcrypt_module
-    
-    # Patch the _finalize_backend_mixin to skip bug detection
-    original_finalize = bcrypt_module._BcryptBackendMixin._finalize_backend_mixin
-    
-    @classmethod
-    def patched_finalize_backend_mixin(cls, name, dryrun=False):
-        """Patched version that skips bug detection"""
-        # Call parent but skip the bug detection step
-        from passlib.utils.handlers import SubclassBackendMixin
-        return SubclassBackendMixin._finalize_backend_mixin(cls, name, dryrun)
-    
-    bcrypt_module._BcryptBackendMixin._finalize_backend_mixin = patched_finalize_backend_mixin
-except Exception:
-    # If patching fails, try simpler approach
-    try:
-        def patched_detect_wrap_bug(ident):
-            return False
-        bcrypt_module.detect_wrap_bug = patched_detect_wrap_bug
-    except Exception:
-        pass
-
 import pytest
 import asyncio
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
@@ -0,0 +1,306 @@
+"""
+Tests for agent helpers
+"""
+import asyncio
+import httpx
+import pytest
+from unittest.mock import patch
+from app.agents.base import BaseAgent, AgentResult
+from app.agents.communication_agent import CommunicationAgent
+from app.agents.purchase_agent import classify_query
+from app.agents.research_agent import (
+    DDG_RESULT_XPATH,
+    DDG_TITLE_XPATH,
+    MAX_CONTENT_LENGTH,
+    MAX_SCRAPE_BYTES,
+    ResearchAgent,
+    element_text,
+    has_class,
+    page_text,
+    parse_html,
+)
+
+
+@pytest.fixture
+def communication_agent() -> CommunicationAgent:
+    """Create a communication agent instance."""
+    return CommunicationAgent("communication")
+
+
+def test_validate_email(communication_agent: CommunicationAgent):
+    """Test email validation accepts well-formed addresses"""
+    assert communication_agent._validate_email("user@example.com")
+    assert communication_agent._validate_email("first.last+tag@sub.example.org")
+    assert not communication_agent._validate_email("not-an-email")
+    assert not communication_agent._validate_email("user@example")
+
+
+def test_validate_email_rejects_trailing_newline(communication_agent: CommunicationAgent):
+    """Test that a trailing newline does not slip past the end anchor"""
+    assert not communication_agent._validate_email("user@example.com\n")
+
+
+def test_classify_query():
+    """Test crypto detection matches whole keywords and names the coin"""
+    assert classify_query("What is the BTC price?") == (True, "bitcoin")
+    assert classify_query("ETH vs SOL") == (True, "ethereum")
+    assert classify_query("how is cardano doing") == (True, "cardano")
+    assert classify_query("how many bitcoins exist") == (True, "bitcoin")
+    assert classify_query("best cryptocurrency to hold") == (True, None)
+    assert classify_query("something for my kitchen") == (False, None)
+    assert classify_query("best laptop under $1000") == (False, None)
+
+
+class EchoAgent(BaseAgent):
+    """Minimal agent relying on the default validation and estimation"""
+
+    async def execute(self, task, context=None) -> AgentResult:
+        return AgentResult(success=True, data={"echo": task.get("message")})
+
+
+@pytest.mark.asyncio
+async def test_run_with_default_hooks():
+    """Test run() applies the default validation and estimation"""
+    agent = EchoAgent("echo", "Echo Agent", "")
+
+    result = await agent.run({"message": "hi"})
+    assert result.success
+    assert result.data == {"echo": "hi"}
+    assert result.estimated_cost == 0.0
+    assert result.risk_level == "low"
+    assert result.requires_approval is False
+
+    result = await agent.run({})
+    assert not result.success
+    assert result.error == "Validation failed: Task is required"
+
+
+def test_classify_query_ignores_keyword_substrings():
+    """Test keywords embedded in longer words are not treated as crypto"""
+    assert classify_query("tokenize this sentence") == (False, None)
+    assert classify_query("a solid adapter for my desk") == (False, None)
+    assert classify_query("Cryptocurrency news") == (True, None)
+
+
+@pytest.mark.asyncio
+async def test_scrape_and_process_runs_concurrently():
+    """Test sources are scraped together and keep their order"""
+    agent = ResearchAgent("research")
+    started = []
+
+    async def fake_scrape(url):
+        started.append(url)
+        await asyncio.sleep(0.05)
+        if url.endswith("/bad"):
+            raise ValueError("boom")
+        return ("", 0) if url.endswith("/empty") else (f"content of {url}", 100)
+
+    agent._scrape_url = fake_scrape
+    sources = [
+        {"title": "A", "url": "https://a.example/"},
+        {"title": "Bad", "url": "https://b.example/bad"},
+        {"title": "No URL"},
+        {"title": "Empty", "url": "https://c.example/empty"},
+        {"title": "D", "url": "https://d.example/"},
+    ]
+
+    processed = await asyncio.wait_for(agent._scrape_and_process(sources), timeout=0.15)
+
+    assert len(started) == 4
+    assert [p["title"] for p in processed] == ["A", "Bad", "D"]
+    assert processed[0]["content"] == "content of https://a.example/"
+    assert processed[1]["error"] == "boom"
+
+
+def test_parse_html_helpers():
+    """Test lxml parsing and text extraction match the scraper's expectations"""
+    document = parse_html(
+        b'<html><body><div class="result extra"><a class="result__a" href="https://x.example">'
+        b' X <b>site</b></a></div><div class="results"></div><p>caf\xc3\xa9</p></body></html>',
+        "utf-8",
+    )
+
+    results = DDG_RESULT_XPATH(document)
+    assert len(results) == 1
+    assert results == document.xpath("//" + has_class("div", "result"))
+    link = DDG_TITLE_XPATH(results[0])[0]
+    assert element_text(link) == "Xsite"
+    assert link.get("href") == "https://x.example"
+    assert element_text(document, separator=" ") == "X site caf\u00e9"
+
+
+@pytest.mark.asyncio
+async def test_scrape_url_caps_body_and_skips_non_html():
+    """Test large pages are read only up to the byte cap and non-HTML is skipped"""
+    page = b"<html><body>" + b"<p>word</p>" * (MAX_SCRAPE_BYTES // 4) + b"</body></html>"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith(".pdf"):
+            return httpx.Response(200, content=b"%PDF-1.7", headers={"Content-Type": "application/pdf"})
+        return httpx.Response(200, content=page, headers={"Content-Type": "text/html; charset=utf-8"})
+
+    agent = ResearchAgent("research")
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        with patch("app.agents.research_agent.get_http_client", return_value=client):
+            text, content_length = await agent._scrape_url("https://example.com/page")
+            assert await agent._scrape_url("https://example.com/file.pdf") == ("", 0)
+
+    assert text.startswith("word word")
+    assert len(text) == MAX_CONTENT_LENGTH
+    assert content_length < MAX_SCRAPE_BYTES // 2  # The full page would yield ~320k characters
+
+
+@pytest.mark.asyncio
+async def test_search_sources_caches_and_coalesces():
+    """Test duplicate queries share one upstream search"""
+    agent = ResearchAgent("research")
+    agent.brave_api_key = None
+    calls = []
+
+    async def fake_search(query):
+        calls.append(query)
+        await asyncio.sleep(0.01)
+        return [{"title": "Result", "url": "https://example.com/cached"}]
+
+    agent._search_duckduckgo = fake_search
+
+    first, second = await asyncio.gather(
+        agent._search_sources("Cache   Test Query"),
+        agent._search_sources("cache test query"),
+    )
+    third = await agent._search_sources(" CACHE test query ")
+
+    assert len(calls) == 1
+    assert first == second == third
+
+
+@pytest.mark.asyncio
+async def test_fetch_page_text_retries_server_errors():
+    """Test a transient 503 is retried and a 404 is not"""
+    attempts = {"flaky": 0, "missing": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        name = request.url.path.strip("/")
+        attempts[name] += 1
+        if name == "missing":
+            return httpx.Response(404)
+        if attempts[name] == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, content=b"<p>recovered</p>", headers={"Content-Type": "text/html"})
+
+    agent = ResearchAgent("research")
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        with patch("app.agents.research_agent.get_http_client", return_value=client):
+            assert await agent._fetch_page_text("https://retry.example/flaky") == ("recovered", 9)
+            assert await agent._fetch_page_text("https://retry.example/missing") == ("", 0)
+
+    assert attempts == {"flaky": 2, "missing": 1}
+
+
+def test_page_text_normalizes_whitespace():
+    """Test page text is collapsed to single spaces and capped"""
+    document = parse_html(b"<html><body><p>  one\n\n two </p><div>\tthree</div></body></html>")
+    assert page_text(document) == ("one two three", len("  one\n\n two  \tthree"))
+
+    long_document = parse_html(b"<p>" + b"x " * MAX_CONTENT_LENGTH + b"</p>")
+    text, content_length = page_text(long_document)
+    assert len(text) == MAX_CONTENT_LENGTH
+    assert content_length == 2 * MAX_CONTENT_LENGTH
+
+
+@pytest.mark.asyncio
+async def test_scrape_and_process_stops_at_deadline():
+    """Test sources still loading at the deadline are reported as timed out"""
+    agent = ResearchAgent("research")
+
+    async def fake_scrape(url):
+        await asyncio.sleep(10 if "slow" in url else 0)
+        return (f"content of {url}", 100)
+
+    agent._scrape_url = fake_scrape
+    sources = [
+        {"title": "Fast", "url": "https://fast.example/"},
+        {"title": "Slow", "url": "https://slow.example/"},
+    ]
+
+    with patch("app.agents.research_agent.SCRAPE_BUDGET_SECONDS", 0.05):
+        processed = await asyncio.wait_for(agent._scrape_and_process(sources), timeout=1.0)
+
+    assert processed[0]["content"] == "content of https://fast.example/"
+    assert processed[1]["error"] == "Timed out"
+
+
+@pytest.mark.asyncio
+async def test_resend_batcher_isolates_failed_emails():
+    """Test a rejected email fails only its own send, and a rejected batch falls back to single sends"""
+    import json
+    from app.agents.communication_agent import ResendBatcher
+
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        payload = json.loads(request.content)
+        if request.url.path == "/emails/batch":
+            if any(email["to"] == "reject-batch@example.com" for email in payload):
+                return httpx.Response(422, json={"message": "Invalid batch"})
+            return httpx.Response(200, json={
+                "data": [{"id": "id-0"}, {"id": "id-2"}],
+                "errors": [{"index": 1, "message": "Invalid `to` field"}],
+            })
+        if payload["to"] == "reject-batch@example.com":
+            return httpx.Response(422, json={"message": "Invalid `to` field"})
+        return httpx.Response(200, json={"id": f"single-{payload['to']}"})
+
+    def item(to):
+        return {"idempotency_key": to, "email": {"from": "a@example.com", "to": to, "subject": "s", "text": "t"}}
+
+    batcher = ResendBatcher("key", max_queue_time=0.01)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        with patch("app.agents.communication_agent.get_http_client", return_value=client):
+            results = await asyncio.gather(
+                *(batcher.process(item(to)) for to in ("a@x.com", "bad", "c@x.com")),
+                return_exceptions=True,
+            )
+            assert results[0] == {"id": "id-0"} and results[2] == {"id": "id-2"}
+            assert str(results[1]) == "Invalid `to` field"
+            assert requests[0].headers["x-batch-validation"] == "permissive"
+            assert requests[0].headers["idempotency-key"]
+
+            requests.clear()
+            results = await asyncio.gather(
+                *(batcher.process(item(to)) for to in ("a@x.com", "reject-batch@example.com")),
+                return_exceptions=True,
+            )
+
+    assert results[0] == {"id": "single-a@x.com"}
+    assert isinstance(results[1], httpx.HTTPStatusError)
+    assert [r.headers["idempotency-key"] for r in requests[1:]] == ["a@x.com", "reject-batch@example.com"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_research_calls_do_not_share_scrape_limit():
+    """Test each research call gets its own scrape concurrency cap"""
+    agent = ResearchAgent("research")
+    running = peak = 0
+
+    async def fake_scrape(url):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        return (f"content of {url}", 100)
+
+    agent._scrape_url = fake_scrape
+
+    def sources(host):
+        return [{"title": str(i), "url": f"https://{host}{i}.example/"} for i in range(5)]
+
+    first, second = await asyncio.wait_for(
+        asyncio.gather(agent._scrape_and_process(sources("a")), agent._scrape_and_process(sources("b"))),
+        timeout=0.09,
+    )
+
+    assert peak == 10
+    assert len(first) == len(second) == 5
@@ -0,0 +1,107 @@
+"""
+Tests for the agents API
+"""
+import pytest
+from unittest.mock import patch
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.agents.base import AgentResult, BaseAgent
+from app.agents.registry import AgentRegistry
+from app.api.v1.agents import list_active_agents
+from app.services.event_service import event_service
+from app.models.agent import Agent, AgentStatus, AgentType
+from app.models.task import Task
+from app.models.user import User
+
+
+@pytest.mark.asyncio
+async def test_list_active_agents_counts_tasks_in_one_query(db_session: AsyncSession, test_user: User):
+    """Test busy agents are listed with their task counts from a single query"""
+    busy = Agent(name="busy", agent_type=list(AgentType)[0], status=AgentStatus.BUSY, created_by=test_user.id)
+    idle_busy = Agent(name="no tasks", agent_type=list(AgentType)[0], status=AgentStatus.BUSY, created_by=test_user.id)
+    idle = Agent(name="idle", agent_type=list(AgentType)[0], status=AgentStatus.IDLE, created_by=test_user.id)
+    db_session.add_all([busy, idle_busy, idle])
+    await db_session.flush()
+    db_session.add_all([
+        Task(title="t", command="c", created_by=test_user.id, assigned_agent_id=agent.id)
+        for agent in (busy, busy, idle)
+    ])
+    await db_session.commit()
+
+    with patch.object(db_session, "stream", wraps=db_session.stream) as stream:
+        response = await list_active_agents(current_user=test_user, db=db_session)
+
+    assert stream.call_count == 1
+    counts = {agent.name: agent.task_count for agent in response.agents}
+    assert counts == {"busy": 2, "no tasks": 0}
+    assert response.count == 2
+    assert response.model_dump(mode="json")["agents"][0]["status"] == "busy"
+
+
+class EchoAgent(BaseAgent):
+    """Agent that echoes its message back"""
+
+    async def execute(self, task, context=None) -> AgentResult:
+        return AgentResult(success=True, data={"echo": task.get("message")})
+
+
+@pytest.mark.asyncio
+async def test_execute_agent_runs_in_background(
+    client: AsyncClient, db_session: AsyncSession, test_user: User, test_user_token: str
+):
+    """Test agents run as a background task by default and inline with ?wait=true"""
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    events = event_service.subscribe(test_user.id)
+
+    try:
+        with patch.object(AgentRegistry, "get", return_value=EchoAgent("echo", "Echo Agent", "")), \
+             patch("app.api.v1.agents.AsyncSessionLocal", session_factory):
+            response = await client.post("/api/v1/agents/echo/execute", json={"message": "hi"}, headers=headers)
+            inline = await client.post("/api/v1/agents/echo/execute?wait=true", json={"message": "hi"}, headers=headers)
+    finally:
+        event_service.unsubscribe(test_user.id, events)
+
+    assert response.status_code == 202
+    task_id = response.json()["task_id"]
+    assert response.json()["status"] == "accepted"
+    assert '"status":"completed"' in events.get_nowait()["data"]
+
+    # The response goes out before the agent runs; the result lands on the task
+    task = await client.get(f"/api/v1/tasks/{task_id}", headers=headers)
+    assert task.json()["status"] == "completed"
+    assert task.json()["result"]["data"] == {"echo": "hi"}
+
+    assert inline.status_code == 200
+    assert inline.json()["result"]["data"] == {"echo": "hi"}
+
+
+@pytest.mark.asyncio
+async def test_run_agent_task_handles_deleted_task_and_errors(db_session: AsyncSession, test_user: User):
+    """Test a deleted task is skipped and a failure while storing the result marks the task failed"""
+    from uuid import uuid4
+    from app.api.v1.agents import run_agent_task
+    from app.models.task import TaskStatus
+
+    session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    task = Task(title="echo agent", command="echo", created_by=test_user.id)
+    db_session.add(task)
+    await db_session.commit()
+    events = event_service.subscribe(test_user.id)
+
+    try:
+        with patch.object(AgentRegistry, "get", return_value=EchoAgent("echo", "Echo Agent", "")), \
+             patch("app.api.v1.agents.AsyncSessionLocal", session_factory):
+            await run_agent_task(uuid4(), "echo", {"message": "hi"}, {}, test_user.id)
+            assert events.empty()
+
+            with patch("app.api.v1.agents.agent_result_payload", side_effect=RuntimeError("storage down")):
+                await run_agent_task(task.id, "echo", {"message": "hi"}, {}, test_user.id)
+    finally:
+        event_service.unsubscribe(test_user.id, events)
+
+    assert '"status":"failed"' in events.get_nowait()["data"]
+    await db_session.refresh(task)
+    assert task.status == TaskStatus.FAILED
+    assert task.error_message == "Agent execution error: storage down"
+    assert task.completed_at is not None
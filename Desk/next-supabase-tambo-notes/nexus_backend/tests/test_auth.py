@@ -3,6 +3,7 @@ Tests for authentication endpoints
 """
 import pytest
 from httpx import AsyncClient
+from unittest.mock import patch
 from app.models.user import User
 from app.services.auth_service import (
     create_access_token,
@@ -10,6 +11,7 @@ from app.services.auth_service import (
     verify_password,
     get_password_hash,
     create_refresh_token,
+    verify_token_batch,
 )
 
 
@@ -150,6 +152,15 @@ async def test_me_endpoint_no_token(client: AsyncClient):
     assert response.status_code == 403  # HTTPBearer returns 403 for missing token
 
 
+@pytest.mark.asyncio
+async def test_protected_endpoint_no_token(client: AsyncClient):
+    """Test JWT-protected endpoints reject a missing token with 401"""
+    response = await client.get("/api/v1/tasks")
+    
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Not authenticated"
+
+
 @pytest.mark.asyncio
 async def test_me_endpoint_invalid_token(client: AsyncClient):
     """Test /me endpoint with invalid token returns 401"""
@@ -200,5 +211,210 @@ async def test_jwt_token_expiry():
     token = create_access_token(data, expires_delta=timedelta(seconds=-1))  # Already expired
     
     # Should raise AuthenticationError
-    with pytest.raises(Exception):  # JWTError or AuthenticationError
+    with pytest.raises(Exception):  # InvalidTokenError or AuthenticationError
         decode_token(token)
+
+
+def test_classify_db_error():
+    """Test database failures are classified in priority order"""
+    from app.api.v1.auth import _classify_db_error
+
+    assert _classify_db_error(OSError("[Errno 10060] Connect call failed")) == "connection"
+    assert _classify_db_error(Exception("socket.gaierror: [Errno 11001] getaddrinfo failed")) == "dns"
+    assert _classify_db_error(Exception("password authentication failed for user")) == "auth"
+    assert _classify_db_error(Exception('relation "users" does not exist')) == "table"
+    assert _classify_db_error(Exception("Connection lost while the table was locked")) == "connection"
+    assert _classify_db_error(ValueError("bad input")) is None
+
+
+def test_decode_token_caches_valid_tokens():
+    """Test repeated decodes of a valid token reuse the verified payload"""
+    from app.services import auth_service
+
+    token = create_access_token({"sub": "456", "email": "cache@example.com"})
+
+    with patch.object(auth_service.jwt, "decode", wraps=auth_service.jwt.decode) as jwt_decode:
+        first = decode_token(token)
+        second = decode_token(token)
+        with pytest.raises(Exception):
+            decode_token(token + "tampered")
+
+    assert first is second
+    assert first["sub"] == "456"
+    assert jwt_decode.call_count == 2  # The cached token plus the tampered one
+
+
+def test_precomputed_hmac_matches_stdlib():
+    """Test tokens signed with the precomputed HMAC state match a plain HMAC-SHA256"""
+    import base64
+    import hashlib
+    import hmac
+    from app.config import settings
+
+    token = create_access_token({"sub": "789"})
+    signing_input, signature = token.rsplit(".", 1)
+    expected = hmac.new(settings.SECRET_KEY.encode(), signing_input.encode(), hashlib.sha256).digest()
+
+    assert base64.urlsafe_b64encode(expected).rstrip(b"=").decode() == signature
+    assert decode_token(token)["sub"] == "789"
+
+
+def test_verify_token_batch_dedupes_tokens():
+    """Test duplicate tokens are verified once and invalid ones map to None"""
+    from app.services import auth_service
+
+    token = create_access_token({"sub": "321"})
+    other = create_access_token({"sub": "654"})
+
+    with patch.object(auth_service, "decode_token", wraps=auth_service.decode_token) as decode:
+        results = verify_token_batch([token, other, token, "not-a-token", token])
+
+    assert decode.call_count == 3
+    assert list(results) == [token, other, "not-a-token"]
+    assert results[token]["sub"] == "321"
+    assert results[other]["sub"] == "654"
+    assert results["not-a-token"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_user_by_email_uses_cached_id(db_session, test_user: User):
+    """Test a repeated email lookup is answered by primary key without a SELECT"""
+    from app.services.auth_service import get_user_by_email, invalidate_user_cache
+
+    invalidate_user_cache(test_user.email)
+    assert await get_user_by_email(db_session, test_user.email) is test_user
+
+    with patch.object(db_session, "execute", wraps=db_session.execute) as execute:
+        assert await get_user_by_email(db_session, test_user.email) is test_user
+        assert await get_user_by_email(db_session, "missing@example.com") is None
+
+    assert execute.call_count == 1  # Only the unknown email reached the database
+
+
+@pytest.mark.asyncio
+async def test_bcrypt_hashes_still_verify_and_are_upgraded(db_session, test_user: User):
+    """Test accounts hashed with bcrypt can log in and are moved to Argon2id"""
+    import bcrypt
+    from app.services.auth_service import authenticate_user, password_needs_rehash
+
+    legacy_hash = bcrypt.hashpw(b"legacypass1", bcrypt.gensalt(rounds=4)).decode()
+    assert verify_password("legacypass1", legacy_hash)
+    assert not verify_password("wrong", legacy_hash)
+    assert not verify_password("legacypass1", "not-a-hash")
+
+    test_user.hashed_password = legacy_hash
+    assert await authenticate_user(db_session, test_user.email, "legacypass1") is test_user
+    assert test_user.hashed_password.startswith("$argon2id$")
+    assert not password_needs_rehash(test_user.hashed_password)
+    assert verify_password("legacypass1", test_user.hashed_password)
+
+
+@pytest.mark.asyncio
+async def test_get_active_user_is_cached(db_session, test_user: User):
+    """Test token authentication reuses the resolved user until invalidated"""
+    from app.api.dependencies import authenticate_token
+    from app.services.auth_service import invalidate_user_cache
+
+    token = create_access_token({"sub": str(test_user.id)})
+    invalidate_user_cache(user_id=test_user.id)
+
+    with patch.object(db_session, "execute", wraps=db_session.execute) as execute:
+        assert await authenticate_token(db_session, token) is test_user
+        assert await authenticate_token(db_session, token) is test_user
+        assert execute.call_count == 1
+
+        invalidate_user_cache(user_id=test_user.id)
+        test_user.is_active = False
+        with pytest.raises(Exception):
+            await authenticate_token(db_session, token)
+
+
+@pytest.mark.asyncio
+async def test_decode_token_async_offloads_asymmetric_algorithms():
+    """Test HMAC tokens decode inline and other algorithms go to a worker thread"""
+    import threading
+    from app.services import auth_service
+
+    token = create_access_token({"sub": "999"})
+    threads = []
+
+    def record_thread(value):
+        threads.append(threading.current_thread())
+        return {"sub": value}
+
+    with patch.object(auth_service, "decode_token", side_effect=record_thread):
+        assert (await auth_service.decode_token_async(token))["sub"] == token
+        with patch.object(auth_service.settings, "ALGORITHM", "RS256"):
+            await auth_service.decode_token_async(token)
+
+    assert threads[0] is threading.main_thread()
+    assert threads[1] is not threading.main_thread()
+
+
+def supabase_token(expires_in: int) -> str:
+    """A JWT shaped like a Supabase access token, expiring in `expires_in` seconds"""
+    import time
+    import jwt
+
+    return jwt.encode({"sub": "u1", "exp": int(time.time()) + expires_in}, "supabase-secret", algorithm="HS256")
+
+
+@pytest.mark.asyncio
+async def test_me_endpoint_caches_supabase_user():
+    """Test /me asks Supabase once per token and forgets the user on logout"""
+    from unittest.mock import AsyncMock
+    from app.api.v1 import auth_simple
+
+    class FakeRedis:
+        def __init__(self):
+            self.values = {}
+
+        async def get(self, key):
+            return self.values.get(key)
+
+        async def setex(self, key, ttl, value):
+            self.values[key] = value
+
+        async def delete(self, key):
+            self.values.pop(key, None)
+
+    fake = FakeRedis()
+    supabase_user = {"id": "u1", "email": "a@example.com", "user_metadata": {"username": "a"}}
+    token = supabase_token(3600)
+
+    with patch.object(auth_simple.settings, "SUPABASE_URL", "https://supabase.test"), \
+         patch.object(auth_simple.settings, "SUPABASE_ANON_KEY", "anon"), \
+         patch.object(auth_simple, "get_redis", return_value=fake), \
+         patch.object(auth_simple.supabase_auth, "get_user", AsyncMock(return_value=supabase_user)) as get_user, \
+         patch.object(auth_simple.supabase_auth, "sign_out", AsyncMock()):
+        first = await auth_simple.get_current_user_info(authorization=f"Bearer {token}")
+        second = await auth_simple.get_current_user_info(authorization=f"Bearer {token}")
+        assert get_user.await_count == 1
+        assert token not in "".join(fake.values)  # Only a digest of the token is stored
+
+        await auth_simple.logout(authorization=f"Bearer {token}")
+        await auth_simple.get_current_user_info(authorization=f"Bearer {token}")
+        assert get_user.await_count == 2
+
+        fake.values.clear()
+        expiring = supabase_token(-5)
+        await auth_simple.get_current_user_info(authorization=f"Bearer {expiring}")
+        assert not fake.values  # Expired tokens are never cached
+
+    assert first == second == {"id": "u1", "email": "a@example.com", "username": "a", "is_active": True}
+
+
+def test_user_cache_ttl_jitter():
+    """Test cached users expire within the jitter window and never past the token"""
+    from app.api.v1 import auth_simple
+
+    token = supabase_token(3600)
+    with patch.object(auth_simple.settings, "TOKEN_CACHE_TTL", 400), \
+         patch.object(auth_simple.settings, "TOKEN_CACHE_JITTER_PCT", 25):
+        ttls = {auth_simple.user_cache_ttl(token) for _ in range(200)}
+    assert min(ttls) >= 300 and max(ttls) <= 400
+    assert len(ttls) > 1
+
+    assert 0 < auth_simple.user_cache_ttl(supabase_token(10)) <= 10
+    assert auth_simple.user_cache_ttl(supabase_token(-5)) == 0
+    assert auth_simple.user_cache_ttl("not-a-jwt") == 0
@@ -0,0 +1,130 @@
+"""
+Tests for budget tracking
+"""
+import pytest
+import redis.asyncio as redis
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import patch
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.transaction import Transaction, TransactionStatus, TransactionType
+from app.models.user import User
+from app.services import budget_service
+from app.services.budget_service import BudgetService, spending_cache_key, utc_today
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio.Redis for the spending cache"""
+
+    def __init__(self):
+        self.values = {}
+
+    async def mget(self, *keys):
+        return [self.values.get(key) for key in keys]
+
+    async def eval(self, script, numkeys, *args):
+        keys, argv = args[:numkeys], args[numkeys:]
+        if script == budget_service._INVALIDATE_SPENDING:
+            self.values[keys[0]] = str(int(self.values.get(keys[0], 0)) + 1)
+            for key in keys[1:]:
+                self.values.pop(key, None)
+            return True
+        cache_key, generation_key = keys
+        if self.values.get(generation_key, "") != argv[0]:
+            return None
+        self.values[cache_key] = argv[2]
+        return True
+
+
+def make_transaction(user: User, cost: float, created_at: datetime, status=TransactionStatus.SUCCESS) -> Transaction:
+    return Transaction(
+        transaction_type=TransactionType.COMMAND.value,
+        status=status.value,
+        cost=cost,
+        created_by=user.id,
+        created_at=created_at,
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_spending_uses_whole_days(db_session: AsyncSession, test_user: User):
+    """Test the date range covers both end days and only successful transactions"""
+    day = date(2024, 3, 10)
+    midnight = datetime(2024, 3, 10, tzinfo=timezone.utc)
+    db_session.add_all([
+        make_transaction(test_user, 1.0, midnight),
+        make_transaction(test_user, 2.0, midnight + timedelta(hours=23, minutes=59)),
+        make_transaction(test_user, 4.0, midnight + timedelta(days=1)),
+        make_transaction(test_user, 8.0, midnight - timedelta(seconds=1)),
+        make_transaction(test_user, 16.0, midnight, status=TransactionStatus.FAILED),
+    ])
+    await db_session.commit()
+
+    assert await BudgetService.get_spending(db_session, test_user.id, day, day) == 3.0
+    assert await BudgetService.get_spending(db_session, test_user.id, day - timedelta(days=1), day) == 11.0
+
+
+@pytest.mark.asyncio
+async def test_get_spending_summary_matches_get_spending(db_session: AsyncSession, test_user: User):
+    """Test the single-query summary agrees with the per-period totals"""
+    now = datetime.now(timezone.utc)
+    today = utc_today()
+    month_start = today.replace(day=1)
+    db_session.add_all([
+        make_transaction(test_user, 1.5, now),
+        make_transaction(test_user, 2.0, datetime.combine(month_start, datetime.min.time(), tzinfo=timezone.utc)),
+        make_transaction(test_user, 4.0, datetime.combine(month_start, datetime.min.time(), tzinfo=timezone.utc) - timedelta(days=1)),
+    ])
+    await db_session.commit()
+
+    summary = await BudgetService.get_spending_summary(db_session, test_user.id)
+
+    assert summary["daily_spending"] == await BudgetService.get_spending(db_session, test_user.id, today, today)
+    assert summary["monthly_spending"] == await BudgetService.get_spending(db_session, test_user.id, month_start, today)
+    assert summary["monthly_spending"] >= 3.5
+
+
+@pytest.mark.asyncio
+async def test_get_spending_reads_through_redis(db_session: AsyncSession, test_user: User):
+    """Test totals are cached, dropped by record_spending, and survive a Redis outage"""
+    fake = FakeRedis()
+    today = utc_today()
+    db_session.add(make_transaction(test_user, 2.5, datetime.now(timezone.utc)))
+    await db_session.commit()
+
+    with patch("app.services.budget_service.get_redis", return_value=fake):
+        assert await BudgetService.get_spending(db_session, test_user.id, today, today) == 2.5
+        assert fake.values[spending_cache_key(test_user.id, today, today)] == "2.5"
+        with patch.object(db_session, "execute") as execute:
+            assert await BudgetService.get_spending(db_session, test_user.id, today, today) == 2.5
+        execute.assert_not_called()
+
+        db_session.add(make_transaction(test_user, 1.25, datetime.now(timezone.utc)))
+        await db_session.commit()
+        await BudgetService.record_spending(db_session, test_user.id, 1.25)
+        assert spending_cache_key(test_user.id, today, today) not in fake.values
+        assert await BudgetService.get_spending(db_session, test_user.id, today, today) == 3.75
+
+    with patch.object(FakeRedis, "mget", side_effect=redis.ConnectionError("down")):
+        with patch("app.services.budget_service.get_redis", return_value=fake):
+            assert await BudgetService.get_spending(db_session, test_user.id, today, today) == 3.75
+
+
+@pytest.mark.asyncio
+async def test_get_spending_does_not_cache_total_read_before_a_commit(db_session: AsyncSession, test_user: User):
+    """Test a total summed before concurrent spending is recorded isn't cached over the invalidation"""
+    fake = FakeRedis()
+    today = utc_today()
+    db_session.add(make_transaction(test_user, 2.5, datetime.now(timezone.utc)))
+    await db_session.commit()
+    execute = db_session.execute
+
+    async def execute_then_record(*args, **kwargs):
+        result = await execute(*args, **kwargs)
+        await BudgetService.record_spending(db_session, test_user.id, 1.0)  # Lands mid-read
+        return result
+
+    with patch("app.services.budget_service.get_redis", return_value=fake):
+        with patch.object(db_session, "execute", side_effect=execute_then_record):
+            assert await BudgetService.get_spending(db_session, test_user.id, today, today) == 2.5
+
+    assert spending_cache_key(test_user.id, today, today) not in fake.values
@@ -0,0 +1,204 @@
+"""
+Tests for the SSE event service
+"""
+import pytest
+from unittest.mock import patch
+from uuid import uuid4
+from app.services.event_service import EventService
+
+
+@pytest.mark.asyncio
+async def test_publish_fans_out_to_each_connection():
+    """Test every connection of a user gets the event and others do not"""
+    service = EventService()
+    user_id, other_id = uuid4(), uuid4()
+    first = service.subscribe(user_id)
+    second = service.subscribe(user_id)
+    other = service.subscribe(other_id)
+
+    try:
+        await service.publish(user_id, "task_created", {"task_id": "t1"})
+
+        assert service.get_subscriber_count(user_id) == 2
+        event = first.get_nowait()
+        assert event["type"] == "task_created"
+        assert second.get_nowait() is event
+        assert other.empty()
+    finally:
+        service.unsubscribe(user_id, first)
+        service.unsubscribe(user_id, second)
+        service.unsubscribe(other_id, other)
+
+    assert service.get_subscriber_count(user_id) == 0
+
+
+@pytest.mark.asyncio
+async def test_publish_drops_oldest_events_for_full_queue():
+    """Test a backed-up connection loses its oldest events without blocking the publisher"""
+    service = EventService()
+    user_id = uuid4()
+
+    with patch("app.services.event_service.SUBSCRIBER_QUEUE_SIZE", 2):
+        queue = service.subscribe(user_id)
+    try:
+        for event_type in ("first", "second", "third"):
+            await service.publish(user_id, event_type, {})
+
+        assert [queue.get_nowait()["type"], queue.get_nowait()["type"]] == ["second", "third"]
+        assert not queue.overflowed
+    finally:
+        service.unsubscribe(user_id, queue)
+
+
+@pytest.mark.asyncio
+async def test_publish_disconnects_stalled_queue():
+    """Test a connection that keeps overflowing is marked and unsubscribed"""
+    service = EventService()
+    user_id = uuid4()
+
+    with patch("app.services.event_service.SUBSCRIBER_QUEUE_SIZE", 1), \
+         patch("app.services.event_service.MAX_CONSECUTIVE_OVERFLOWS", 3):
+        queue = service.subscribe(user_id)
+        for _ in range(4):
+            await service.publish(user_id, "tick", {})
+
+        assert queue.overflowed
+        assert service.get_subscriber_count(user_id) == 0
+
+
+@pytest.mark.asyncio
+async def test_publish_broadcast_serializes_once():
+    """Test a broadcast encodes its payload once and shares the event"""
+    service = EventService()
+    user_id, other_id = uuid4(), uuid4()
+    first = service.subscribe(user_id)
+    second = service.subscribe(other_id)
+
+    try:
+        with patch("app.services.event_service.jsonlib.dumps", return_value="{}") as dumps:
+            await service.publish_broadcast("maintenance", {"minutes": 5})
+
+        assert dumps.call_count == 1
+        assert first.get_nowait() is second.get_nowait()
+    finally:
+        service.unsubscribe(user_id, first)
+        service.unsubscribe(other_id, second)
+
+
+@pytest.mark.asyncio
+async def test_publish_serializes_uuids_and_datetimes():
+    """Test payloads may carry UUID and datetime values directly"""
+    from datetime import datetime
+
+    service = EventService()
+    user_id = uuid4()
+    queue = service.subscribe(user_id)
+
+    try:
+        await service.publish(user_id, "status_changed", {"task_id": user_id, "at": datetime(2024, 1, 2, 3, 4, 5)})
+        event = queue.get_nowait()
+        assert event["data"] == f'{{"task_id":"{user_id}","at":"2024-01-02T03:04:05"}}'
+        assert event["sse"] == f'id: {event["id"]}\nevent: status_changed\ndata: {event["data"]}\n\n'.encode()
+    finally:
+        service.unsubscribe(user_id, queue)
+
+
+def test_event_service_is_a_slotted_singleton():
+    """Test the subscriber registry lives on the single instance"""
+    service = EventService()
+
+    assert EventService() is service
+    assert not hasattr(service, "__dict__")
+    assert isinstance(service._queues, dict)
+
+
+class FakeRedis:
+    """Records published messages"""
+
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+        return 1
+
+
+@pytest.mark.asyncio
+async def test_publish_relays_through_redis():
+    """Test a relaying worker publishes to Redis and delivers what its listener receives"""
+    service = EventService()
+    user_id = uuid4()
+    queue = service.subscribe(user_id)
+    fake_redis = FakeRedis()
+
+    service._relaying = True
+    try:
+        with patch("app.services.event_service.get_redis", return_value=fake_redis):
+            await service.publish(user_id, "task_created", {"task_id": "t1"})
+
+        assert queue.empty()
+        [(channel, message)] = fake_redis.published
+        assert channel == f"events:user:{user_id}"
+
+        service._receive({"channel": channel, "data": message})
+        event = queue.get_nowait()
+        assert event["type"] == "task_created"
+        assert event["data"] == '{"task_id":"t1"}'
+        assert event["sse"] == f'id: {event["id"]}\nevent: task_created\ndata: {event["data"]}\n\n'.encode()
+    finally:
+        service._relaying = False
+        service.unsubscribe(user_id, queue)
+
+
+@pytest.mark.asyncio
+async def test_publish_falls_back_to_local_delivery_when_redis_fails():
+    """Test events still reach this worker's connections if Redis is down"""
+    import redis.asyncio as redis
+
+    service = EventService()
+    user_id = uuid4()
+    queue = service.subscribe(user_id)
+    fake_redis = FakeRedis()
+
+    async def fail(channel, message):
+        raise redis.ConnectionError("down")
+
+    fake_redis.publish = fail
+    service._relaying = True
+    try:
+        with patch("app.services.event_service.get_redis", return_value=fake_redis):
+            await service.publish_broadcast("maintenance", {})
+
+        assert queue.get_nowait()["type"] == "maintenance"
+    finally:
+        service._relaying = False
+        service.unsubscribe(user_id, queue)
+
+
+@pytest.mark.asyncio
+async def test_relay_survives_errors_and_backs_off():
+    """Test the relay keeps retrying with growing delays and warns once per outage"""
+    import asyncio
+
+    service = EventService()
+    attempts = []
+
+    class BrokenRedis:
+        def pubsub(self, **kwargs):
+            attempts.append(asyncio.get_running_loop().time())
+            raise RuntimeError("not a RedisError")
+
+    with patch("app.services.event_service.get_redis", return_value=BrokenRedis()), \
+         patch("app.services.event_service.RELAY_RETRY_SECONDS", 0.01), \
+         patch("app.services.event_service.logger") as logger:
+        service.start()
+        try:
+            await asyncio.sleep(0.1)
+            assert not service._relay.done()
+            assert not service._relaying
+        finally:
+            await service.stop()
+
+    assert len(attempts) >= 3
+    assert attempts[2] - attempts[1] > attempts[1] - attempts[0]
+    assert logger.warning.call_count == 1
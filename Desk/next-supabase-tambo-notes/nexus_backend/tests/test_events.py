@@ -0,0 +1,28 @@
+"""
+Tests for the SSE events endpoint
+"""
+import asyncio
+import pytest
+from unittest.mock import MagicMock
+from app.api.v1.events import CONNECTED_FRAME, stream_events
+from app.services.event_service import event_service
+
+
+@pytest.mark.asyncio
+async def test_stream_events_delivers_without_waiting_for_ping():
+    """Test a published event is streamed at once and the connection cleans up"""
+    user = MagicMock(id="stream-user")
+    response = await stream_events(request=MagicMock(), current_user=user)
+    frames = response.body_iterator
+
+    assert await frames.__anext__() == CONNECTED_FRAME
+    next_frame = asyncio.ensure_future(frames.__anext__())
+    await asyncio.sleep(0)
+    await event_service.publish(user.id, "task_created", {"task_id": "t1"})
+
+    frame = await asyncio.wait_for(next_frame, timeout=1)
+    assert frame.startswith(b"id: ")
+    assert frame.endswith(b'\nevent: task_created\ndata: {"task_id":"t1"}\n\n')
+
+    await frames.aclose()
+    assert event_service.get_subscriber_count(user.id) == 0
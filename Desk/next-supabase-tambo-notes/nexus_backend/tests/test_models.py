@@ -0,0 +1,30 @@
+"""
+Tests for ORM model behaviour
+"""
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.task import Task
+from app.models.transaction import Transaction, TransactionType
+from app.models.user import User
+
+
+@pytest.mark.asyncio
+async def test_server_defaults_are_loaded_on_insert(db_session: AsyncSession, test_user: User):
+    """Test server-generated columns are populated by the INSERT, without a refresh"""
+    task = Task(title="Task: research", command="research", created_by=test_user.id)
+    db_session.add(task)
+    await db_session.flush()
+    transaction = Transaction(
+        transaction_type=TransactionType.COMMAND.value,
+        task_id=task.id,
+        created_by=test_user.id,
+    )
+    db_session.add(transaction)
+    await db_session.commit()
+
+    for obj in (task, transaction):
+        state = inspect(obj)
+        assert not state.expired_attributes & {"id", "created_at", "updated_at"}
+        assert obj.created_at is not None
+    assert transaction.id is not None
@@ -0,0 +1,31 @@
+"""
+Tests for TaskExecutor helpers
+"""
+from app.schemas.intent import IntentResult
+from app.services.task_executor import TaskExecutor
+
+
+def make_intent(intent: str, command: str = None) -> IntentResult:
+    return IntentResult(intent=intent, confidence=0.9, command=command)
+
+
+def test_determine_agent_type():
+    """Test intents and commands map to agents in priority order"""
+    assert TaskExecutor._determine_agent_type(make_intent("web_search")) == "research"
+    assert TaskExecutor._determine_agent_type(make_intent("Send_Email")) == "communication"
+    assert TaskExecutor._determine_agent_type(make_intent("compare products")) == "purchase"
+    assert TaskExecutor._determine_agent_type(make_intent("find and email prices")) == "research"
+    assert TaskExecutor._determine_agent_type(make_intent("execute_command", "buy_item")) == "purchase"
+    assert TaskExecutor._determine_agent_type(make_intent("unknown")) == "research"
+
+
+def test_dependency_summary():
+    """Test the first available summary is used, preferring the agent data"""
+    assert TaskExecutor._dependency_summary({
+        "0": "not a result",
+        "1": {"data": {"sources": []}},
+        "2": {"data": {"summary": "from data"}, "summary": "top level"},
+        "3": {"summary": "later"},
+    }) == "from data"
+    assert TaskExecutor._dependency_summary({"0": {"data": None, "summary": "top level"}}) == "top level"
+    assert TaskExecutor._dependency_summary({"0": {"data": {"summary": ""}}}) is None
@@ -0,0 +1,146 @@
+"""
+Tests for task endpoint helpers
+"""
+import pytest
+from httpx import AsyncClient
+from unittest.mock import patch
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.v1.tasks import etag_matches, finished_status
+from app.models.task import Task, TaskStatus
+from app.models.user import User
+
+
+def test_finished_status():
+    """Test only final statuses of the watched task end the wait"""
+    def event(data: str) -> dict:
+        return {"id": "1", "type": "status_changed", "data": data}
+
+    assert finished_status(event('{"task_id":"t1","status":"completed"}'), "t1") == "completed"
+    assert finished_status(event('{"task_id":"t1","status":"failed","error":"x"}'), "t1") == "failed"
+    assert finished_status(event('{"task_id":"t1","status":"in_progress"}'), "t1") is None
+    assert finished_status(event('{"task_id":"t2","status":"completed"}'), "t1") is None
+    assert finished_status(event('{"task_id":"t1"}'), "t1") is None
+
+
+def test_etag_matches():
+    """Test If-None-Match accepts lists and the wildcard"""
+    assert etag_matches('W/"a"', 'W/"a"')
+    assert etag_matches('W/"b", W/"a"', 'W/"a"')
+    assert etag_matches("*", 'W/"a"')
+    assert not etag_matches('W/"b"', 'W/"a"')
+    assert not etag_matches(None, 'W/"a"')
+
+
+@pytest.mark.asyncio
+async def test_get_task_conditional_request(
+    client: AsyncClient, db_session: AsyncSession, test_user: User, test_user_token: str
+):
+    """Test an unchanged task is answered with 304 and a changed one in full"""
+    task = Task(title="t", command="c", created_by=test_user.id)
+    db_session.add(task)
+    await db_session.commit()
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    response = await client.get(f"/api/v1/tasks/{task.id}", headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = await client.get(f"/api/v1/tasks/{task.id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    task.status = TaskStatus.COMPLETED
+    await db_session.commit()
+
+    response = await client.get(f"/api/v1/tasks/{task.id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
+    assert response.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_approve_task_locks_row_and_keeps_notes(
+    client: AsyncClient, db_session: AsyncSession, test_user: User, test_user_token: str
+):
+    """Test approval locks the task row and merges notes into an existing result"""
+    task = Task(title="t", command="c", created_by=test_user.id, result={"requires_approval": True})
+    db_session.add(task)
+    await db_session.commit()
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    with patch.object(db_session, "execute", wraps=db_session.execute) as execute:
+        response = await client.post(f"/api/v1/tasks/{task.id}/approve?notes=ok", headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "in_progress"
+    statement = execute.call_args.args[0]
+    assert "FOR UPDATE" in str(statement.compile(dialect=postgresql.dialect()))
+
+    await db_session.refresh(task)
+    assert task.result["requires_approval"] is True
+    assert task.result["approval_notes"] == "ok"
+
+    response = await client.post(f"/api/v1/tasks/{task.id}/approve", headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_list_tasks(client: AsyncClient, db_session: AsyncSession, test_user: User, test_user_token: str):
+    """Test the task list validates a page of rows into responses"""
+    db_session.add_all([
+        Task(title=f"t{i}", command="c", created_by=test_user.id, status=status)
+        for i, status in enumerate([TaskStatus.PENDING, TaskStatus.COMPLETED, TaskStatus.PENDING])
+    ])
+    await db_session.commit()
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    response = await client.get("/api/v1/tasks", headers=headers)
+    assert response.status_code == 200
+    assert sorted(task["title"] for task in response.json()) == ["t0", "t1", "t2"]
+
+    response = await client.get("/api/v1/tasks?status_filter=pending&limit=1", headers=headers)
+    assert [task["status"] for task in response.json()] == ["pending"]
+
+
+@pytest.mark.asyncio
+async def test_task_events_rechecks_row_when_event_is_lost(
+    db_session: AsyncSession, test_user: User, test_user_token: str
+):
+    """Test the task WebSocket re-reads the task when no event arrives"""
+    import asyncio
+    from sqlalchemy import update
+    from app.api.v1.tasks import task_events
+
+    task = Task(title="t", command="c", created_by=test_user.id, status=TaskStatus.IN_PROGRESS)
+    db_session.add(task)
+    await db_session.commit()
+    task_id = task.id
+
+    class FakeWebSocket:
+        headers = {"authorization": f"Bearer {test_user_token}"}
+
+        def __init__(self):
+            self.sent = []
+            self.closed = False
+
+        async def accept(self):
+            # The task finishes right after the initial read, and no event is published
+            await db_session.execute(update(Task).where(Task.id == task_id).values(status=TaskStatus.COMPLETED))
+            await db_session.commit()
+
+        async def receive(self):
+            await asyncio.Event().wait()  # The client stays connected
+
+        async def send_json(self, data):
+            self.sent.append(data)
+
+        async def close(self, code=1000):
+            self.closed = True
+
+    websocket = FakeWebSocket()
+    with patch("app.api.v1.tasks.TASK_EVENTS_RECHECK_SECONDS", 0.01):
+        await asyncio.wait_for(task_events(websocket, task_id, db=db_session), timeout=1.0)
+
+    assert websocket.sent == [{"task_id": str(task_id), "status": "completed"}]
+    assert websocket.closed
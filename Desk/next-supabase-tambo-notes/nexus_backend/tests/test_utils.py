@@ -0,0 +1,182 @@
+"""
+Tests for utility helpers
+"""
+import asyncio
+import json
+import httpx
+import pytest
+from unittest.mock import patch
+from app.utils.batcher import AsyncBatcher
+from app.utils.cache import SingleFlight, TTLCache
+from app.utils.http_client import is_retryable, retry_delay
+from app.utils.llm import JSONObjectScanner, stream_groq_json
+
+
+def test_ttl_cache_get_set():
+    """Test cached values are returned until they expire"""
+    cache = TTLCache(ttl=60)
+    cache.set("btc", {"price_usd": 1.0})
+
+    assert cache.get("btc") == {"price_usd": 1.0}
+    assert cache.get("eth") is None
+
+    cache.set("eth", "expired", ttl=-1)
+    assert cache.get("eth") is None
+    assert len(cache) == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    """Test that the cache stays within maxsize"""
+    cache = TTLCache(ttl=60, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" is now least recently used
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+class EchoBatcher(AsyncBatcher):
+    """Batcher that records each batch it processes"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+
+    async def process_batch(self, items):
+        self.batches.append(list(items))
+        return [item * 2 for item in items]
+
+
+@pytest.mark.asyncio
+async def test_async_batcher_groups_concurrent_items():
+    """Test that concurrent calls share one batch and get their own result"""
+    batcher = EchoBatcher(max_batch_size=10, max_queue_time=0.01)
+
+    results = await asyncio.gather(*(batcher.process(i) for i in range(3)))
+
+    assert results == [0, 2, 4]
+    assert batcher.batches == [[0, 1, 2]]
+
+
+@pytest.mark.asyncio
+async def test_async_batcher_flushes_at_max_batch_size():
+    """Test that a full batch is sent without waiting for the timer"""
+    batcher = EchoBatcher(max_batch_size=2, max_queue_time=60)
+
+    results = await asyncio.wait_for(
+        asyncio.gather(batcher.process(1), batcher.process(2)), timeout=1.0
+    )
+
+    assert results == [2, 4]
+
+
+def test_json_object_scanner_stops_at_closing_brace():
+    """Test the scanner finds the end of the first object across chunks"""
+    scanner = JSONObjectScanner()
+
+    assert not scanner.feed('```json\n{"subject": "Hi {there}", ')
+    assert not scanner.feed('"body": "say \\"}\\"", "tags": {"a": 1}')
+    assert scanner.feed('}\n```')
+    assert json.loads(scanner.text()) == {"subject": "Hi {there}", "body": 'say "}"', "tags": {"a": 1}}
+
+
+@pytest.mark.asyncio
+async def test_stream_groq_json_assembles_deltas():
+    """Test streamed Groq deltas are joined and parsed"""
+    chunks = ['{"recommendation": ', '"Laptop A"', ', "factors": ["price"]}']
+    body = "".join(
+        f"data: {json.dumps({'choices': [{'delta': {'content': c}}]})}\n\n" for c in chunks
+    ) + "data: [DONE]\n\n"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        with patch("app.utils.llm.get_http_client", return_value=client):
+            result = await stream_groq_json("test-key", [{"role": "user", "content": "compare"}])
+
+    assert result == {"recommendation": "Laptop A", "factors": ["price"]}
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_calls():
+    """Test concurrent calls with one key run the function once"""
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"value": calls}
+
+    results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(5)))
+
+    assert calls == 1
+    assert all(result == {"value": 1} for result in results)
+
+    # Once finished, the next call runs again
+    assert await flight.do("key", fetch) == {"value": 2}
+
+
+@pytest.mark.asyncio
+async def test_single_flight_one_follower_takes_over_cancelled_call():
+    """Test followers of a cancelled call share a single retry"""
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    leader = asyncio.create_task(flight.do("key", fetch))
+    await asyncio.sleep(0)
+    followers = [asyncio.create_task(flight.do("key", fetch)) for _ in range(3)]
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await asyncio.gather(*followers) == [2, 2, 2]
+    assert calls == 2
+    assert not flight._inflight
+
+
+
+    """Test which errors are retried and how long to back off"""
+    request = httpx.Request("GET", "https://example.com")
+
+    def status_error(status_code, headers=None):
+        response = httpx.Response(status_code, headers=headers, request=request)
+        return httpx.HTTPStatusError("error", request=request, response=response)
+
+    assert is_retryable(status_error(503))
+    assert is_retryable(httpx.ConnectError("refused", request=request))
+    assert not is_retryable(status_error(404))
+
+    assert retry_delay(1, status_error(429, {"Retry-After": "3"})) == 3.0
+    assert retry_delay(1, status_error(429, {"Retry-After": "120"})) == 5.0
+    assert 0.1 <= retry_delay(1) <= 0.2
+    assert 1.0 <= retry_delay(10) <= 2.0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_follower_runs_when_leader_is_cancelled():
+    """Test a waiting caller runs the call itself if the leading caller is cancelled"""
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    leader = asyncio.ensure_future(flight.do("key", fetch))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(flight.do("key", fetch))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "done"